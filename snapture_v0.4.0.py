@@ -18,16 +18,40 @@ Working:
 
 
 import os
+import sys
+import io
 import json
 import base64
+import hashlib
+import mimetypes
 import shutil
 import time
+import random
 import threading
 import requests
 import re
+import mmap
+import marshal
+import select
+import struct
+import ctypes
+import ctypes.util
+import sqlite3
+import errno
+import zlib
+import bisect
+import heapq
+import math
+import http.server
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csr_matrix
+from scipy.fft import dctn
+import numpy as np
 import os
 import tkinter as tk
 from tkinter import ttk
@@ -36,6 +60,10 @@ from tkinter import filedialog
 from PIL import Image, ImageTk, ImageDraw, ImageFilter
 
 from dotenv import load_dotenv
+try:
+    import fcntl  # reflinks; not available on Windows
+except ImportError:
+    fcntl = None
 load_dotenv()
 
 
@@ -44,6 +72,75 @@ AI_API_KEY = os.getenv("AI_API_KEY")
 AI_BASE_URL = os.getenv("AI_BASE_URL")
 AI_URL = f"{AI_BASE_URL}key={AI_API_KEY}"
 
+# Number of screenshots captioned at the same time (1 = one by one)
+CAPTION_CONCURRENCY = max(1, int(os.getenv("CAPTION_CONCURRENCY", "4")))
+
+# Adaptive concurrency: the in-flight limit starts at CAPTION_CONCURRENCY and moves
+# between the min/max below; it only grows while responses arrive within the target latency
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "1") == "1"
+AI_MIN_CONCURRENCY = max(1, int(os.getenv("AI_MIN_CONCURRENCY", "1")))
+AI_MAX_CONCURRENCY = max(CAPTION_CONCURRENCY, int(os.getenv("AI_MAX_CONCURRENCY", "16")))
+AI_TARGET_LATENCY = float(os.getenv("AI_TARGET_LATENCY", "15"))
+
+# AI request quota, burst size and retry behaviour. No quota by default: 429/Retry-After
+# responses still pause every worker. Set a quota to stay under a known API limit.
+AI_REQUESTS_PER_MINUTE = float(os.getenv("AI_REQUESTS_PER_MINUTE", "0"))
+AI_BURST = max(1, int(os.getenv("AI_BURST", str(CAPTION_CONCURRENCY))))
+AI_MAX_ATTEMPTS = max(1, int(os.getenv("AI_MAX_ATTEMPTS", "5")))
+AI_BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", "1.0"))
+AI_BACKOFF_MAX = float(os.getenv("AI_BACKOFF_MAX", "60"))
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "60"))
+
+# Screenshots are downscaled and re-encoded before upload (JPEG, WEBP or PNG)
+UPLOAD_MAX_SIDE = max(64, int(os.getenv("UPLOAD_MAX_SIDE", "1600")))
+UPLOAD_FORMAT = os.getenv("UPLOAD_FORMAT", "JPEG").upper()
+UPLOAD_QUALITY = int(os.getenv("UPLOAD_QUALITY", "85"))
+
+# Screenshots packed into one caption request (1 = one image per request)
+CAPTION_BATCH_SIZE = max(1, int(os.getenv("CAPTION_BATCH_SIZE", "1")))
+
+# Clustering: minimum caption similarity to join an album, and rows compared per step
+CLUSTER_THRESHOLD = float(os.getenv("CLUSTER_THRESHOLD", "0.4"))
+CLUSTER_CHUNK_SIZE = max(1, int(os.getenv("CLUSTER_CHUNK_SIZE", "256")))
+
+# Similarities below this are left out of the stored clustering hierarchy, so albums can be
+# re-cut at any threshold from here up without recomputing it. Each screenshot keeps at most
+# HIERARCHY_NEIGHBOURS of its most similar screenshots, so the hierarchy grows linearly.
+HIERARCHY_MIN_SIMILARITY = float(os.getenv("HIERARCHY_MIN_SIMILARITY", "0.1"))
+HIERARCHY_NEIGHBOURS = max(1, int(os.getenv("HIERARCHY_NEIGHBOURS", "10")))
+
+# New screenshots join an existing album when their caption is this close to its centroid
+# (unset = the clustering threshold last chosen in the GUI)
+INCREMENTAL_ALBUMS = os.getenv("INCREMENTAL_ALBUMS", "1") == "1"
+ALBUM_ASSIGN_THRESHOLD = os.getenv("ALBUM_ASSIGN_THRESHOLD")
+ALBUM_ASSIGN_THRESHOLD = float(ALBUM_ASSIGN_THRESHOLD) if ALBUM_ASSIGN_THRESHOLD else None
+
+# "vocabulary" keeps real terms; "hashing" folds them into a fixed number of buckets
+VECTORIZER_MODE = os.getenv("VECTORIZER_MODE", "vocabulary")
+VECTORIZER_HASH_FEATURES = max(1, int(os.getenv("VECTORIZER_HASH_FEATURES", str(2 ** 20))))
+
+# Near-duplicates: screenshots whose perceptual hashes differ in at most this many of
+# NEAR_DUPLICATE_HASH_SIZE² bits share one caption request (-1 = off)
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "24"))
+NEAR_DUPLICATE_HASH_SIZE = max(4, int(os.getenv("NEAR_DUPLICATE_HASH_SIZE", "16")))
+# Hashes are indexed by NEAR_DUPLICATE_DISTANCE + 1 slices, so any match shares one exactly
+NEAR_DUPLICATE_BITS = NEAR_DUPLICATE_HASH_SIZE ** 2
+NEAR_DUPLICATE_CHUNKS = max(1, min(NEAR_DUPLICATE_BITS, NEAR_DUPLICATE_DISTANCE + 1))
+
+# Album naming: "batch" (one text-only request for all clusters) or "per-cluster"
+ALBUM_NAMING_MODE = os.getenv("ALBUM_NAMING_MODE", "batch").lower()
+
+# AI backend: "http" (AI_URL), "mock" (built-in local server), "record" or "replay"
+AI_BACKEND = os.getenv("AI_BACKEND", "http").lower()
+AI_REPLAY_LATENCY = os.getenv("AI_REPLAY_LATENCY", "0") == "1"  # replay with recorded response times
+
+# Local mock server behaviour (AI_BACKEND=mock)
+MOCK_LATENCY = float(os.getenv("MOCK_LATENCY", "0.5"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_RATE_LIMIT_RATE = float(os.getenv("MOCK_RATE_LIMIT_RATE", "0"))
+MOCK_RETRY_AFTER = os.getenv("MOCK_RETRY_AFTER", "1")
+MOCK_SEED = int(os.getenv("MOCK_SEED", "0"))
+
 
 
 
@@ -52,51 +149,1361 @@ base_directory = os.path.dirname(os.path.abspath(__file__))
 screenshots_directory = os.path.join(base_directory, "Screenshots")
 text_files_directory = os.path.join(base_directory, "TXTs")
 albums_directory = os.path.join(base_directory, "Albums")
+caption_cache_path = os.path.join(base_directory, "caption_cache.json")
+recordings_directory = os.path.join(base_directory, "Recordings")
+journal_path = os.path.join(base_directory, "processing_journal.jsonl")
+database_path = os.path.join(base_directory, "snapture.db")
+catalog_snapshot_path = os.path.join(base_directory, "catalog_snapshot.bin")
+album_centroids_path = os.path.join(base_directory, "album_centroids.json")
+text_vectors_path = os.path.join(base_directory, "text_vectors.json")
+cluster_hierarchy_path = os.path.join(base_directory, "cluster_hierarchy.json")
+
+# Metadata lives in snapture.db; TXT files are still written next to it for compatibility
+EXPORT_TXT_FILES = os.getenv("EXPORT_TXT_FILES", "1") == "1"
+
+# How screenshots are put into Albums/<name>/: "reflink", "hardlink", "symlink", "copy",
+# "auto" (first of reflink, hardlink, copy that works on the filesystem) or "virtual"
+# (no files at all; albums only exist in the catalog)
+ALBUM_STORAGE = os.getenv("ALBUM_STORAGE", "auto").lower()
+VIRTUAL_ALBUMS = ALBUM_STORAGE == "virtual"
+
+# Watch the Screenshots folder and process new/changed files automatically
+WATCH_SCREENSHOTS = os.getenv("WATCH_SCREENSHOTS", "0") == "1"
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "2"))  # polling fallback, seconds
+WATCH_SETTLE_DELAY = float(os.getenv("WATCH_SETTLE_DELAY", "1"))  # coalesce bursts of events, seconds
+
+# Search waits this long after the last keystroke before looking up suggestions
+SEARCH_DEBOUNCE_MS = max(0, int(os.getenv("SEARCH_DEBOUNCE_MS", "150")))
+
+# Search ranking: "bm25" (best matches first, at most SEARCH_RESULT_LIMIT) or "catalog" (all, in catalog order)
+SEARCH_RANKING = os.getenv("SEARCH_RANKING", "bm25").lower()
+SEARCH_RESULT_LIMIT = max(1, int(os.getenv("SEARCH_RESULT_LIMIT", "200")))
+# BM25F weights for title, description, tags, album and file name
+SEARCH_FIELD_WEIGHTS = (3.0, 1.0, 2.0, 1.5, 0.5)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Query words of 4+ letters that start no indexed word fall back to words within this many typos
+SEARCH_FUZZY_MAX_DISTANCE = max(0, int(os.getenv("SEARCH_FUZZY_MAX_DISTANCE", "2")))
+
+# How many tag and album facet chips the filter bar shows (most frequent first)
+FACET_CHIP_LIMIT = max(0, int(os.getenv("FACET_CHIP_LIMIT", "8")))
 
 for folder in (text_files_directory, albums_directory):
     os.makedirs(folder, exist_ok=True)
 
 # === Utility Functions ===
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
 def sanitize(name: str) -> str:
     return re.sub(r'[<>:"/\\|?*]', '', name).strip() or "Uncategorized"
 
-def call_AI(prompt: str, image_path: str):
+
+def unique_name(name, taken):
+    # "Travel", then "Travel 2", "Travel 3", ... until it is not in `taken`
+    candidate, number = name, 2
+    while candidate in taken:
+        candidate = f"{name} {number}"
+        number += 1
+    return candidate
+
+class LibraryScanner:
+    """Cached os.scandir listings; a directory is only re-read when its mtime changes."""
+
+    # Directory mtimes this recent may still change within the same timestamp tick
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def list_images(self, directory):
+        # {file name: (size, mtime_ns)} for every image directly inside `directory`
+        try:
+            directory_mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self.lock:
+            cached = self.cache.get(directory)
+        if cached and cached[0] == directory_mtime and time.time_ns() - directory_mtime > self.RACY_WINDOW_NS:
+            return cached[1]
+        entries = {}
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            self.cache[directory] = (directory_mtime, entries)
+        return entries
+
+    def list_albums(self):
+        # {album name: sorted image names}, in album-name order
+        with os.scandir(albums_directory) as iterator:
+            album_folders = sorted(entry.name for entry in iterator if entry.is_dir())
+        album_paths = [os.path.join(albums_directory, album_folder) for album_folder in album_folders]
+        if len(album_paths) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                listings = list(executor.map(self.list_images, album_paths))
+        else:
+            listings = [self.list_images(path) for path in album_paths]
+        return {album_folder: sorted(listing) for album_folder, listing in zip(album_folders, listings)}
+
+
+library_scanner = LibraryScanner()
+
+def build_album_index(store=None):
+    # One pass over Albums/ (or the catalog, for virtual albums): {album: sorted image names}
+    # plus {image name: album} so "is this screenshot in an album?" is a dict lookup
+    if VIRTUAL_ALBUMS and store is not None:
+        present = library_scanner.list_images(screenshots_directory)
+        albums = {
+            album: [file_name for file_name in file_names if file_name in present]
+            for album, file_names in store.album_members().items()
+        }
+    else:
+        albums = library_scanner.list_albums()
+    album_index = {}
+    for album_folder, file_names in albums.items():
+        for file_name in file_names:
+            album_index.setdefault(file_name, album_folder)
+    return albums, album_index
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+
+
+def reflink_file(source, destination):
+    # Copy-on-write clone (Btrfs, XFS, ...): shares the data blocks until either file changes
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+    shutil.copystat(source, destination)
+
+
+ALBUM_PLACERS = {
+    "reflink": reflink_file,
+    "hardlink": os.link,
+    "symlink": lambda source, destination: os.symlink(os.path.abspath(source), destination),
+    "copy": shutil.copy2,
+}
+AUTO_ALBUM_STORAGE = ("reflink", "hardlink", "copy")
+album_storage_methods = {}  # (source device, album device) -> first method that worked in auto mode
+
+
+def place_in_album(source, destination):
+    # Puts `source` at `destination` using ALBUM_STORAGE
+    if os.path.lexists(destination):
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            return  # already linked
+        os.remove(destination)
+    if ALBUM_STORAGE != "auto":
+        ALBUM_PLACERS[ALBUM_STORAGE](source, destination)
+        return
+    devices = (os.stat(source).st_dev, os.stat(os.path.dirname(destination)).st_dev)
+    known = album_storage_methods.get(devices)
+    methods = AUTO_ALBUM_STORAGE[AUTO_ALBUM_STORAGE.index(known):] if known else AUTO_ALBUM_STORAGE
+    for method in methods:
+        try:
+            ALBUM_PLACERS[method](source, destination)
+        except OSError:
+            if method == methods[-1]:
+                raise
+            continue
+        album_storage_methods[devices] = method
+        return
+
+# === AI Client ===
+class RateLimiter:
+    """Token bucket shared by all AI requests. A 429 pauses every worker, not just one."""
+
+    def __init__(self, requests_per_minute, burst):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            # Restart the bucket empty so workers resume at the steady rate, not in a burst
+            self.tokens = 0.0
+            self.updated = self.paused_until
+
+
+class ConcurrencyController:
+    """AIMD limit on in-flight AI requests: grows per healthy round, halves on 429/503/timeouts."""
+
+    def __init__(self, initial, minimum, maximum, target_latency, window=500):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window)
+        self.successes = 0
+        self.congestion_events = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, outcome):
+        # outcome: "ok", "congested" (429 / timeout / 503) or "error" (anything else)
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome == "ok":
+                self.successes += 1
+                self.latencies.append(latency)
+                if latency <= self.target_latency:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == "congested":
+                self.congestion_events += 1
+                if now - self.last_decrease >= (self.percentile(50) or 1.0):
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.last_decrease = now
+                    print(f"⚙️ AI concurrency limit lowered to {int(self.limit)}")
+            self.condition.notify_all()
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "successes": self.successes,
+                "congestion_events": self.congestion_events,
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+            }
+
+    def summary(self):
+        stats = self.snapshot()
+        if stats["p50"] is None:
+            return ""
+        return (f"AI concurrency {stats['limit']}, latency p50 {stats['p50']:.1f}s / "
+                f"p90 {stats['p90']:.1f}s / p99 {stats['p99']:.1f}s.")
+
+
+def create_http_session():
+    # One keep-alive pool sized for the caption workers, reused by every call_AI
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(10, AI_MAX_CONCURRENCY))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+http_session = create_http_session()
+ai_rate_limiter = RateLimiter(AI_REQUESTS_PER_MINUTE, AI_BURST)
+if ADAPTIVE_CONCURRENCY:
+    ai_concurrency = ConcurrencyController(CAPTION_CONCURRENCY, AI_MIN_CONCURRENCY, AI_MAX_CONCURRENCY, AI_TARGET_LATENCY)
+else:
+    ai_concurrency = ConcurrencyController(CAPTION_CONCURRENCY, CAPTION_CONCURRENCY, CAPTION_CONCURRENCY, AI_TARGET_LATENCY)
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    # Exponential backoff with jitter so parallel workers don't retry in lockstep
+    delay = min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+UPLOAD_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def encode_image(image_path):
+    # Returns (mime_type, base64 data) for an image, capped at UPLOAD_MAX_SIDE pixels
+    upload_format = UPLOAD_FORMAT if UPLOAD_FORMAT in UPLOAD_MIME_TYPES else "JPEG"
+    try:
+        with Image.open(image_path) as img:
+            # Already small and in the upload format: fall through and send the original bytes
+            if img.format != upload_format or max(img.size) > UPLOAD_MAX_SIDE:
+                # Let the JPEG decoder downscale while decoding (no-op for other formats)
+                img.draft("RGB", (UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE))
+                img.thumbnail((UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE), Image.LANCZOS)
+                if upload_format == "JPEG" and img.mode != "RGB":
+                    # JPEG has no alpha channel: flatten transparent areas onto white
+                    rgba = img.convert("RGBA")
+                    img = Image.new("RGB", rgba.size, (255, 255, 255))
+                    img.paste(rgba, mask=rgba.getchannel("A"))
+                elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+                    img = img.convert("RGBA")
+                buffer = io.BytesIO()
+                img.save(buffer, format=upload_format, quality=UPLOAD_QUALITY, optimize=True)
+                return UPLOAD_MIME_TYPES[upload_format], base64.b64encode(buffer.getbuffer()).decode("ascii")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not re-encode {os.path.basename(image_path)}, uploading original: {e}")
     with open(image_path, "rb") as image_file:
-        image_encoded = base64.b64encode(image_file.read()).decode()
+        data = image_file.read()
+    mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+    return mime_type, base64.b64encode(data).decode("ascii")
 
-    payload = {
-        "contents": [{
-            "parts": [
-                {"text": prompt},
-                {"inline_data": {"mime_type": "image/jpeg", "data": image_encoded}}
-            ]
-        }]
-    }
 
-    for attempt in range(3):
+def image_part(image_path):
+    mime_type, image_encoded = encode_image(image_path)
+    return {"inline_data": {"mime_type": mime_type, "data": image_encoded}}
+
+
+def call_AI(prompt: str, image_path: str):
+    return post_AI([{"text": prompt}, image_part(image_path)])
+
+
+def post_AI(parts):
+    # Serialise once; retries re-send the same bytes. The parts list is emptied
+    # afterwards so the base64 strings can be freed while the request is in flight.
+    body = json.dumps({"contents": [{"parts": parts}]}).encode("utf-8")
+    parts.clear()
+
+    if AI_BACKEND == "replay":
+        return replay_response(body)
+    started = time.monotonic()
+    text = send_AI_request(body)
+    if AI_BACKEND == "record" and text is not None:
+        record_response(body, text, time.monotonic() - started)
+    return text
+
+
+def send_AI_request(body):
+    url = ai_endpoint()
+    for attempt in range(AI_MAX_ATTEMPTS):
+        # Wait for the quota before taking a slot, so waiting workers do not hold slots
+        ai_rate_limiter.acquire()
+        ai_concurrency.acquire()
+        delay = backoff_delay(attempt)
+        response = None
+        outcome = "error"
+        started = time.monotonic()
         try:
-            response = requests.post(
-                AI_URL,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(payload)
-            )
-            response.raise_for_status()
+            response = http_session.post(url, data=body, timeout=AI_TIMEOUT)
             if response.status_code == 200:
-                return response.json()["candidates"][0]["content"]["parts"][0]["text"]
-            elif response.status_code == 429:
-                print("❌ AI API rate limit. Try again later.")
-                return None
-            else:
-                print("❌ AI API error:", response.text)
-                return None
+                outcome = "ok"
+            elif response.status_code in (429, 503):
+                outcome = "congested"
         except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.Timeout):
+                outcome = "congested"
             print(f"[Attempt {attempt + 1}] AI API call failed: {e}")
-            if attempt < 2:
-                print("Retrying in 3 seconds...")
-                time.sleep(3)
-    print("❌ AI API failed after 3 attempts.")
+        finally:
+            ai_concurrency.release(time.monotonic() - started, outcome)
+
+        if response is None:
+            pass
+        elif response.status_code == 200:
+            try:
+                return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+            except (ValueError, KeyError, IndexError, TypeError):
+                print("❌ Unexpected AI API response:", response.text)
+                return None
+        elif response.status_code == 429:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = retry_after
+            print(f"[Attempt {attempt + 1}] AI API rate limit, pausing requests for {delay:.1f} seconds...")
+            ai_rate_limiter.pause(delay)
+            continue
+        elif response.status_code >= 500:
+            print(f"[Attempt {attempt + 1}] AI API server error {response.status_code}")
+        else:
+            print("❌ AI API error:", response.text)
+            return None
+        if attempt < AI_MAX_ATTEMPTS - 1:
+            print(f"Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+    print(f"❌ AI API failed after {AI_MAX_ATTEMPTS} attempts.")
     return None
 
+# === Local AI Backend (mock server, record & replay) ===
+def recording_path(body):
+    return os.path.join(recordings_directory, hashlib.sha256(body).hexdigest() + ".json")
+
+
+def record_response(body, text, latency):
+    os.makedirs(recordings_directory, exist_ok=True)
+    path = recording_path(body)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"text": text, "latency": round(latency, 4)}, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def replay_response(body):
+    # Requests are matched byte-for-byte, so replays need the same images and upload settings
+    path = recording_path(body)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            recording = json.load(f)
+    except (OSError, ValueError):
+        print(f"❌ No recording for request {os.path.basename(path)}")
+        return None
+    if AI_REPLAY_LATENCY:
+        time.sleep(recording.get("latency", 0))
+    return recording["text"]
+
+
+class MockAIServer:
+    """Local stand-in for the AI endpoint with deterministic captions and injected faults."""
+
+    TOPICS = [
+        ("Recipe for creamy pasta", "Cooking instructions for a pasta dish.", ["cooking", "recipe", "pasta", "food"]),
+        ("Python traceback in terminal", "A Python error shown in a terminal window.", ["python", "code", "error", "terminal"]),
+        ("Online shopping receipt", "Order confirmation with prices and totals.", ["receipt", "shopping", "payment", "order"]),
+        ("Chat conversation with a friend", "Messages exchanged in a chat app.", ["chat", "messages", "social", "friend"]),
+        ("Flight booking confirmation", "Travel itinerary with flight times.", ["travel", "flight", "booking", "itinerary"]),
+        ("Weather forecast for the week", "Daily temperatures and rain chances.", ["weather", "forecast", "temperature"]),
+        ("Bank account balance", "Banking app showing recent transactions.", ["bank", "finance", "transactions", "balance"]),
+        ("News article about technology", "Headline and summary of a tech story.", ["news", "technology", "article"]),
+    ]
+
+    def __init__(self, latency=MOCK_LATENCY, error_rate=MOCK_ERROR_RATE, rate_limit_rate=MOCK_RATE_LIMIT_RATE,
+                 retry_after=MOCK_RETRY_AFTER, seed=MOCK_SEED):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, headers, payload = server.handle(body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/generate?key=mock"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def handle(self, body):
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+        time.sleep(self.latency)
+        if roll < self.rate_limit_rate:
+            return 429, {"Retry-After": self.retry_after}, {"error": {"code": 429, "message": "Quota exceeded"}}
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, {}, {"error": {"code": 500, "message": "Internal error"}}
+        try:
+            parts = json.loads(body)["contents"][0]["parts"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return 400, {}, {"error": {"code": 400, "message": "Invalid request"}}
+        text = self.respond(parts)
+        return 200, {}, {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    def topic(self, image_data):
+        digest = hashlib.sha256(image_data.encode("ascii")).digest()
+        return self.TOPICS[int.from_bytes(digest[:4], "big") % len(self.TOPICS)]
+
+    def respond(self, parts):
+        prompt = parts[0].get("text", "")
+        images = [part["inline_data"]["data"] for part in parts if "inline_data" in part]
+        if "JSON array" in prompt:
+            return json.dumps([
+                {"image": number, "title": title, "description": description, "tags": tags}
+                for number, (title, description, tags) in enumerate(map(self.topic, images), start=1)
+            ])
+        if "Title:" in prompt and images:
+            title, description, tags = self.topic(images[0])
+            return f"Title: {title}\nDescription: {description}\nTags: {', '.join(tags)}"
+        # Folder naming: name each album after the most common tag of its group
+        if "numbered group" in prompt:
+            groups = re.findall(r"^Group (\d+): .*Tags: (.*)$", prompt, re.MULTILINE)
+            return "\n".join(f"{number}: {self.folder_name(tags)}" for number, tags in groups)
+        return self.folder_name(prompt.split("Tags:", 1)[-1])
+
+    @staticmethod
+    def folder_name(tags_text):
+        tags = re.findall(r"'([^']+)'", tags_text)
+        return Counter(tags).most_common(1)[0][0].title() if tags else "Misc"
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+mock_server = None
+mock_server_lock = threading.Lock()
+
+
+def ai_endpoint():
+    # The mock server is only started the first time a request needs it
+    global mock_server
+    if AI_BACKEND != "mock":
+        return AI_URL
+    with mock_server_lock:
+        if mock_server is None:
+            mock_server = MockAIServer()
+            print(f"Using local mock AI backend at {mock_server.url}")
+    return mock_server.url
+
+
+def file_hash(path):
+    # SHA-256 of the file contents, read in chunks so large images stay out of memory
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# === Near-Duplicate Detection ===
+def image_phash(image_path, hash_size=NEAR_DUPLICATE_HASH_SIZE):
+    # Perceptual hash: low-frequency DCT coefficients of a small grayscale copy compared
+    # with their median. Returns None for (nearly) flat images, which would all look alike.
+    side = hash_size * 4
+    with Image.open(image_path) as img:
+        img.draft("L", (side * 2, side * 2))  # let JPEG decode at reduced size
+        small = img.convert("L").resize((side, side), Image.LANCZOS, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.float64)
+    if pixels.std() < 2.0:
+        return None
+    coefficients = dctn(pixels, norm="ortho")[:hash_size, :hash_size].ravel()
+    bits = coefficients > np.median(coefficients[1:])  # the DC term only reflects brightness
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def hash_chunks(key, bits=NEAR_DUPLICATE_BITS, count=NEAR_DUPLICATE_CHUNKS):
+    # Splits a `bits`-wide hash into `count` nearly equal slices, most significant first
+    chunks = []
+    offset = bits
+    for index in range(count):
+        width = bits // count + (index < bits % count)
+        offset -= width
+        chunks.append((key >> offset) & ((1 << width) - 1))
+    return chunks
+
+
+class MultiIndexHash:
+    """Hamming-radius lookup over integer hashes by exact matches on their slices."""
+
+    def __init__(self, bits=NEAR_DUPLICATE_BITS, count=NEAR_DUPLICATE_CHUNKS):
+        self.bits = bits
+        self.count = count
+        self.tables = [{} for _ in range(count)]
+        self.keys = {}  # value -> key
+
+    def add(self, key, value):
+        self.keys[value] = key
+        for table, chunk in zip(self.tables, hash_chunks(key, self.bits, self.count)):
+            table.setdefault(chunk, {})[value] = key
+
+    def remove(self, value):
+        key = self.keys.pop(value, None)
+        if key is not None:
+            for table, chunk in zip(self.tables, hash_chunks(key, self.bits, self.count)):
+                del table[chunk][value]
+
+    def query(self, key, radius):
+        # (distance, value) for every stored hash within radius, closest first. Two hashes
+        # within count - 1 bits share at least one slice, so only those are compared.
+        seen = set()
+        matches = []
+        for table, chunk in zip(self.tables, hash_chunks(key, self.bits, self.count)):
+            for value, stored in table.get(chunk, {}).items():
+                if value in seen:
+                    continue
+                seen.add(value)
+                distance = hamming_distance(key, stored)
+                if distance <= radius:
+                    matches.append((distance, value))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+# === Caption Cache ===
+class CaptionCache:
+    """Captions keyed by image content hash, so renamed or copied screenshots skip the AI."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring unreadable caption cache: {e}")
+
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["title"], entry["description"], list(entry["tags"])
+
+    def put(self, digest, title, description, tags):
+        entry = {"title": title, "description": description, "tags": list(tags)}
+        with self.lock:
+            if self.entries.get(digest) != entry:
+                self.entries[digest] = entry
+                self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            # Write to a temp file first so a crash never leaves a half-written cache
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        if not lookups:
+            return ""
+        return f"Caption cache: {self.hits}/{lookups} reused."
+
+# === Metadata Store ===
+def write_txt(txt_file_path, title, description, tags):
+    with open(txt_file_path, "w", encoding="utf-8") as txt_file:
+        txt_file.write(f"Title:\n{title}\n\n")
+        txt_file.write(f"Description:\n{description}\n\n")
+        txt_file.write(f"Tags:\n{', '.join(tags)}")
+
+
+class MetadataStore:
+    """SQLite catalog of screenshot metadata (titles, tags, albums, hashes, mtimes)."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS albums (
+            name TEXT PRIMARY KEY,
+            created REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS screenshots (
+            file_name TEXT PRIMARY KEY,
+            title TEXT NOT NULL DEFAULT '',
+            description TEXT NOT NULL DEFAULT '',
+            content_hash TEXT,
+            size INTEGER,
+            mtime REAL,
+            album TEXT REFERENCES albums(name)
+        );
+        CREATE INDEX IF NOT EXISTS screenshots_album ON screenshots(album);
+        CREATE INDEX IF NOT EXISTS screenshots_hash ON screenshots(content_hash);
+        CREATE TABLE IF NOT EXISTS tags (
+            file_name TEXT NOT NULL REFERENCES screenshots(file_name) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (file_name, position)
+        );
+        CREATE INDEX IF NOT EXISTS tags_tag ON tags(tag COLLATE NOCASE);
+        CREATE TABLE IF NOT EXISTS image_hashes (
+            file_name TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            phash TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path):
+        self.lock = threading.RLock()
+        self.hash_index = None  # MultiIndexHash over image_hashes, see near_hashes()
+        # Shared between the GUI and the processor thread; the lock serialises access
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(self.SCHEMA)
+        if self.get_meta("imported") is None:
+            self.import_legacy()
+
+    def transaction(self):
+        return _Transaction(self)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.transaction():
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def cluster_threshold(self):
+        # Threshold last chosen in the GUI, else CLUSTER_THRESHOLD
+        value = self.get_meta("cluster_threshold")
+        return float(value) if value is not None else CLUSTER_THRESHOLD
+
+    def import_legacy(self):
+        # One-time import of existing TXTs/ and Albums/ trees
+        screenshot_names = {}
+        if os.path.isdir(screenshots_directory):
+            for file_name in sorted(os.listdir(screenshots_directory)):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    screenshot_names.setdefault(os.path.splitext(file_name)[0], file_name)
+        imported = 0
+        with self.transaction():
+            if self.get_meta("imported") is not None:
+                return  # another instance imported while we waited for the lock
+            for txt_name in sorted(os.listdir(text_files_directory)):
+                file_name = screenshot_names.get(os.path.splitext(txt_name)[0])
+                if not txt_name.endswith(".txt") or file_name is None:
+                    continue
+                with open(os.path.join(text_files_directory, txt_name), "r", encoding="utf-8") as f:
+                    title, description, tags = SnaptureProcessor.parse_txt(f.read())
+                self.save_caption(file_name, title, description, tags)
+                imported += 1
+            album_files, _ = build_album_index()
+            for album_folder, file_names in album_files.items():
+                album_path = os.path.join(albums_directory, album_folder)
+                for file_name in file_names:
+                    txt_file_path = os.path.join(album_path, os.path.splitext(file_name)[0] + ".txt")
+                    if self.get(file_name) is None and os.path.exists(txt_file_path):
+                        with open(txt_file_path, "r", encoding="utf-8") as f:
+                            title, description, tags = SnaptureProcessor.parse_txt(f.read())
+                        self.save_caption(file_name, title, description, tags)
+                        imported += 1
+                self.assign_album(file_names, album_folder)
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported', ?)", (str(time.time()),))
+        if imported:
+            print(f"Imported metadata for {imported} screenshots into {os.path.basename(database_path)}")
+
+    def save_caption(self, file_name, title, description, tags, content_hash=None, image_path=None):
+        size = mtime = None
+        if image_path:
+            stat = os.stat(image_path)
+            size, mtime = stat.st_size, stat.st_mtime
+        with self.transaction():
+            self.connection.execute(
+                """INSERT INTO screenshots (file_name, title, description, content_hash, size, mtime)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(file_name) DO UPDATE SET
+                       title = excluded.title,
+                       description = excluded.description,
+                       content_hash = COALESCE(excluded.content_hash, content_hash),
+                       size = COALESCE(excluded.size, size),
+                       mtime = COALESCE(excluded.mtime, mtime)""",
+                (file_name, title, description, content_hash, size, mtime),
+            )
+            self.connection.execute("DELETE FROM tags WHERE file_name = ?", (file_name,))
+            self.connection.executemany(
+                "INSERT INTO tags (file_name, position, tag) VALUES (?, ?, ?)",
+                [(file_name, position, tag) for position, tag in enumerate(tags)],
+            )
+
+    def assign_album(self, file_names, album):
+        with self.transaction():
+            self.connection.execute("INSERT OR IGNORE INTO albums (name, created) VALUES (?, ?)", (album, time.time()))
+            self.connection.executemany(
+                "INSERT INTO screenshots (file_name, album) VALUES (?, ?) "
+                "ON CONFLICT(file_name) DO UPDATE SET album = excluded.album",
+                [(file_name, album) for file_name in file_names],
+            )
+
+    def forget(self, file_names):
+        # Drops metadata of deleted screenshots that were never copied into an album
+        with self.transaction():
+            self.connection.executemany(
+                "DELETE FROM screenshots WHERE file_name = ? AND album IS NULL",
+                [(file_name,) for file_name in file_names],
+            )
+            self.connection.executemany(
+                "DELETE FROM image_hashes WHERE file_name = ?", [(file_name,) for file_name in file_names]
+            )
+            if self.hash_index is not None:
+                for file_name in file_names:
+                    self.hash_index.remove(file_name)
+
+    def image_hashes(self, file_names):
+        # {file_name: (size, mtime_ns, phash or None)} for those of `file_names` hashed before;
+        # hashes are stored as hex because they exceed 64 bits
+        hashes = {}
+        with self.lock:
+            for file_name in file_names:
+                row = self.connection.execute(
+                    "SELECT size, mtime_ns, phash FROM image_hashes WHERE file_name = ?", (file_name,)
+                ).fetchone()
+                if row:
+                    hashes[file_name] = (row[0], row[1], int(row[2], 16) if row[2] else None)
+        return hashes
+
+    def save_image_hashes(self, rows):
+        # rows: [(file_name, size, mtime_ns, phash or None)]
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO image_hashes (file_name, size, mtime_ns, phash) VALUES (?, ?, ?, ?)",
+                [(file_name, size, mtime_ns, None if phash is None else format(phash, "x"))
+                 for file_name, size, mtime_ns, phash in rows],
+            )
+            if self.hash_index is not None:
+                for file_name, _, _, phash in rows:
+                    self.hash_index.remove(file_name)
+                    if phash is not None:
+                        self.hash_index.add(phash, file_name)
+
+    def near_hashes(self, phash, radius):
+        # (distance, file name) of stored hashes within radius, closest first. The index is
+        # built on first use and kept up to date, so later runs on this store reuse it.
+        with self.lock:
+            if self.hash_index is None:
+                self.hash_index = MultiIndexHash()
+                for file_name, phash_hex in self.connection.execute(
+                        "SELECT file_name, phash FROM image_hashes WHERE phash IS NOT NULL"):
+                    self.hash_index.add(int(phash_hex, 16), file_name)
+            return self.hash_index.query(phash, radius)
+
+    def get(self, file_name):
+        # Returns (title, description, tags, album) or None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT title, description, album FROM screenshots WHERE file_name = ?", (file_name,)
+            ).fetchone()
+            if row is None:
+                return None
+            tags = [tag for (tag,) in self.connection.execute(
+                "SELECT tag FROM tags WHERE file_name = ? ORDER BY position", (file_name,))]
+        return row[0], row[1], tags, row[2]
+
+    def album_members(self):
+        # {album: sorted file names} as recorded in the catalog
+        members = {}
+        with self.lock:
+            for album, file_name in self.connection.execute(
+                    "SELECT album, file_name FROM screenshots WHERE album IS NOT NULL ORDER BY album, file_name"):
+                members.setdefault(album, []).append(file_name)
+        return members
+
+    def all_records(self):
+        # {file_name: (title, description, tags, album)} for the whole catalog in two queries
+        with self.lock:
+            records = {
+                file_name: (title, description, [], album)
+                for file_name, title, description, album in self.connection.execute(
+                    "SELECT file_name, title, description, album FROM screenshots")
+            }
+            for file_name, tag in self.connection.execute("SELECT file_name, tag FROM tags ORDER BY file_name, position"):
+                records[file_name][2].append(tag)
+        return records
+
+    def export_txt_files(self):
+        # Writes a TXT for every captioned screenshot, in TXTs/ and next to album copies
+        exported = 0
+        for file_name, (title, description, tags, album) in self.all_records().items():
+            if not title:
+                continue
+            txt_name = os.path.splitext(file_name)[0] + ".txt"
+            write_txt(os.path.join(text_files_directory, txt_name), title, description, tags)
+            if album and os.path.isdir(os.path.join(albums_directory, album)):
+                write_txt(os.path.join(albums_directory, album, txt_name), title, description, tags)
+            exported += 1
+        return exported
+
+
+class _Transaction:
+    # Re-entrant BEGIN IMMEDIATE / COMMIT around MetadataStore writes
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        self.outermost = not self.store.connection.in_transaction
+        if self.outermost:
+            self.store.connection.execute("BEGIN IMMEDIATE")
+        return self.store
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.outermost:
+                self.store.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.store.lock.release()
+        return False
+
+# === Processing Journal ===
+class ProcessingJournal:
+    """Append-only JSON-lines record of the current run; a run without "done" is resumed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def start_run(self):
+        # Only the latest run matters, so a new run starts a fresh journal
+        with self.lock:
+            self.close_file()
+            self.file = open(self.path, "w", encoding="utf-8")
+        self.append("run", durable=True, started=time.time())
+
+    def append(self, stage, durable=False, **fields):
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(json.dumps({"stage": stage, **fields}, ensure_ascii=False) + "\n")
+            self.file.flush()
+            if durable:
+                os.fsync(self.file.fileno())
+
+    def finish(self):
+        self.append("done", durable=True)
+        with self.lock:
+            self.close_file()
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def interrupted_run(self):
+        # Returns the state of an unfinished run, or None if the last run completed
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        state = {"captioned": set(), "clusters": {}, "names": {}, "copied": {}, "retired": {}, "reserved": None}
+        finished = True
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash mid-write
+            stage = record.get("stage")
+            if stage == "run":
+                finished = False
+            elif stage == "captioned":
+                state["captioned"].add(record["file"])
+            elif stage == "clustered":
+                state["clusters"][record["cluster"]] = record["files"]
+            elif stage == "named":
+                state["names"][record["cluster"]] = record["album"]
+            elif stage == "copied":
+                state["copied"][record["file"]] = record["album"]
+            elif stage == "retired":
+                state["retired"] = record["albums"]
+            elif stage == "reserved":
+                state["reserved"] = set(record["albums"])
+            elif stage == "done":
+                finished = True
+        return None if finished else state
+
+# === Clustering ===
+def leader_clusters(vectors, threshold, chunk_size=CLUSTER_CHUNK_SIZE):
+    """Greedy leader clustering over L2-normalised sparse rows, one chunk of rows at a time."""
+    vectors = vectors.tocsr()
+    leaders = []  # row index of each cluster's first member; position = cluster number
+    clusters = []
+    for start in range(0, vectors.shape[0], chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        # Leaders from earlier chunks are fixed, so they can be scored in one product
+        earlier = None
+        if leaders:
+            earlier = (chunk @ vectors[leaders].T).tocsr()
+            earlier.data[earlier.data < threshold] = 0
+            earlier.eliminate_zeros()
+        # Leaders created inside this chunk are only known row by row
+        within = (chunk @ chunk.T).tocsr()
+        within.data[within.data < threshold] = 0
+        within.eliminate_zeros()
+        chunk_leaders = {}  # offset in chunk -> cluster number
+        for offset in range(chunk.shape[0]):
+            cluster_number = None
+            if earlier is not None:
+                matches = earlier.indices[earlier.indptr[offset]:earlier.indptr[offset + 1]]
+                if len(matches):
+                    cluster_number = int(matches.min())
+            if cluster_number is None:
+                matches = within.indices[within.indptr[offset]:within.indptr[offset + 1]]
+                candidates = [chunk_leaders[j] for j in matches if j < offset and j in chunk_leaders]
+                if candidates:
+                    cluster_number = min(candidates)
+            if cluster_number is None:
+                chunk_leaders[offset] = len(clusters)
+                leaders.append(start + offset)
+                clusters.append([start + offset])
+            else:
+                clusters[cluster_number].append(start + offset)
+    return clusters
+
+def similarity_edges(vectors, threshold, top_k=HIERARCHY_NEIGHBOURS, chunk_size=CLUSTER_CHUNK_SIZE):
+    # (similarity, i, j) with j < i linking every row to its top_k most similar other rows
+    # whose cosine is at least threshold; rows must be L2-normalised
+    vectors = vectors.tocsr()
+    size = vectors.shape[0]
+    transposed = vectors.T.tocsr()
+    # Each step scores its rows against all rows, so fewer rows per step as the library grows
+    chunk_size = max(1, min(chunk_size, 4_000_000 // max(1, size)))
+    edges = {}
+    for chunk_start in range(0, size, chunk_size):
+        products = (vectors[chunk_start:chunk_start + chunk_size] @ transposed).tocsr()
+        for offset in range(products.shape[0]):
+            row = chunk_start + offset
+            columns = products.indices[products.indptr[offset]:products.indptr[offset + 1]]
+            similarities = products.data[products.indptr[offset]:products.indptr[offset + 1]]
+            keep = (similarities >= threshold) & (columns != row)
+            columns, similarities = columns[keep], similarities[keep]
+            if len(columns) > top_k:
+                best = np.argpartition(similarities, -top_k)[-top_k:]
+                columns, similarities = columns[best], similarities[best]
+            for column, similarity in zip(columns.tolist(), similarities.tolist()):
+                edges[(row, column) if column < row else (column, row)] = similarity
+    return [(similarity, i, j) for (i, j), similarity in edges.items()]
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        # Returns False when a and b were already connected; the smaller root wins so
+        # components are labelled by their first member
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        if b < a:
+            a, b = b, a
+        self.parent[b] = a
+        return True
+
+
+def average_linkage(size, edges, min_similarity):
+    # Average-linkage merges [similarity, i, j] of `size` items, highest similarity first, from the
+    # sparse (similarity, i, j) edges; pairs without an edge count as similarity 0. Average linkage
+    # is reducible, so the merge similarities never increase and any threshold is a prefix.
+    sums = [{} for _ in range(size)]  # live cluster -> {neighbouring cluster: summed similarity}
+    for similarity, i, j in edges:
+        sums[i][j] = sums[j][i] = similarity
+    members = [1] * size
+    heap = [(-similarity, i, j) for similarity, i, j in edges]
+    heapq.heapify(heap)
+    merges = []
+    while heap:
+        negative, a, b = heapq.heappop(heap)
+        if sums[a] is None or sums[b] is None or b not in sums[a]:
+            continue
+        similarity = sums[a][b] / (members[a] * members[b])
+        if similarity != -negative:
+            continue  # superseded by a later push for this pair
+        if similarity < min_similarity:
+            break
+        merges.append([similarity, a, b])
+        keep, gone = (a, b) if len(sums[a]) >= len(sums[b]) else (b, a)
+        del sums[keep][gone]
+        for neighbour, total in sums[gone].items():
+            if neighbour != keep:
+                del sums[neighbour][gone]
+                sums[keep][neighbour] = sums[neighbour][keep] = sums[keep].get(neighbour, 0.0) + total
+        sums[gone] = None
+        members[keep] += members[gone]
+        for neighbour, total in sums[keep].items():
+            average = total / (members[keep] * members[neighbour])
+            if average >= min_similarity:
+                heapq.heappush(heap, (-average, keep, neighbour))
+    return merges
+
+
+class ClusterHierarchy:
+    """Average-linkage merge history of every captioned screenshot, persisted as JSON."""
+
+    def __init__(self, path, vectorizer, min_similarity=HIERARCHY_MIN_SIMILARITY, neighbours=HIERARCHY_NEIGHBOURS):
+        self.path = path
+        self.vectorizer = vectorizer
+        self.min_similarity = min_similarity
+        self.neighbours = neighbours
+        self.files = []
+        self.digests = []  # caption digest per file; any change means new IDF weights
+        self.merges = []  # [similarity, i, j], highest similarity first
+        self.names = {}  # member-set key -> album name, so going back to a cut reuses it
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("signature") == [vectorizer.signature, min_similarity, "average", neighbours]:
+                    self.files, self.digests, self.merges, self.names = data["files"], data["digests"], data["merges"], data["names"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Rebuilding unreadable cluster hierarchy: {e}")
+
+    @staticmethod
+    def members_key(file_names):
+        return hashlib.sha1("\n".join(sorted(file_names)).encode("utf-8")).hexdigest()
+
+    def update(self, records):
+        # Brings the hierarchy in line with the captioned screenshots in `records` (call
+        # vectorizer.refresh(records) first). A new, removed or re-captioned screenshot shifts
+        # the IDF of every vector, so then all neighbour similarities are recomputed and the
+        # merges rebuilt; otherwise nothing is done. Returns True if anything changed.
+        captioned = sorted(file_name for file_name, record in records.items() if record[0])
+        documents = self.vectorizer.documents
+        digests = [documents[file_name][0] for file_name in captioned]
+        if captioned == self.files and digests == self.digests:
+            return False
+        matrix = self.vectorizer.matrix([(file_name, caption_text(*records[file_name][:2])) for file_name in captioned])
+        self.files, self.digests = captioned, digests
+        edges = similarity_edges(matrix, self.min_similarity, self.neighbours)
+        self.merges = average_linkage(len(captioned), edges, self.min_similarity)
+        return True
+
+    def cut(self, threshold):
+        # Average-linkage clusters at `threshold` as lists of file names, ordered by first member
+        components = UnionFind(len(self.files))
+        for similarity, i, j in self.merges:
+            if similarity < threshold:
+                break
+            components.union(i, j)
+        clusters = {}
+        for i, file_name in enumerate(self.files):
+            clusters.setdefault(components.find(i), []).append(file_name)
+        return list(clusters.values())
+
+    def save(self):
+        data = {
+            "signature": [self.vectorizer.signature, self.min_similarity, "average", self.neighbours],
+            "files": self.files, "digests": self.digests, "merges": self.merges, "names": self.names,
+        }
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def caption_text(title, description):
+    return title + " " + description
+
+
+class TextVectorizer:
+    """Persisted TF-IDF term counts and document frequencies shared by every run."""
+
+    def __init__(self, path, mode=VECTORIZER_MODE, hash_features=VECTORIZER_HASH_FEATURES):
+        self.path = path
+        self.mode = mode if mode == "hashing" else "vocabulary"
+        self.signature = f"hashing:{hash_features}" if self.mode == "hashing" else "vocabulary"
+        self.hash_features = hash_features
+        # Same lowercasing/tokenising as scikit-learn's TfidfVectorizer
+        self.analyzer = TfidfVectorizer().build_analyzer()
+        self.documents = {}  # file_name -> [caption digest, {term: count}]
+        self.document_frequency = Counter()
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("signature") == self.signature:
+                    self.documents = data["documents"]
+                    for _, counts in self.documents.values():
+                        self.document_frequency.update(counts.keys())
+                else:
+                    print("⚙️ Vectorizer settings changed, re-tokenising captions.")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Rebuilding unreadable text vectors: {e}")
+
+    def term(self, token):
+        if self.mode == "hashing":
+            return str(zlib.crc32(token.encode("utf-8")) % self.hash_features)
+        return token
+
+    def update(self, file_name, text):
+        # Term counts for a caption; only tokenises when the caption changed since last time
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        document = self.documents.get(file_name)
+        if document is not None and document[0] == digest:
+            return document[1]
+        if document is not None:
+            self.document_frequency.subtract(document[1].keys())
+        counts = dict(Counter(self.term(token) for token in self.analyzer(text)))
+        self.documents[file_name] = [digest, counts]
+        self.document_frequency.update(counts.keys())
+        self.dirty = True
+        return counts
+
+    def refresh(self, records):
+        # Bring the counts in line with the catalog: add or re-tokenise changed captions
+        # and drop screenshots that are gone or no longer captioned
+        for file_name in list(self.documents):
+            if file_name not in records or not records[file_name][0]:
+                self.document_frequency.subtract(self.documents.pop(file_name)[1].keys())
+                self.dirty = True
+        for file_name, (title, description, tags, album) in records.items():
+            if title:
+                self.update(file_name, caption_text(title, description))
+
+    def idf(self, term):
+        # Smoothed IDF, as TfidfVectorizer computes it
+        return math.log((1 + len(self.documents)) / (1 + self.document_frequency.get(term, 0))) + 1
+
+    def tf_vector(self, file_name, text):
+        # L2-normalised raw term counts; IDF-free, so sums of these stay valid as IDF drifts
+        counts = self.update(file_name, text)
+        norm = math.sqrt(sum(count * count for count in counts.values()))
+        return {term: count / norm for term, count in counts.items()} if norm else {}
+
+    def tfidf_vector(self, file_name, text):
+        weights = {term: count * self.idf(term) for term, count in self.update(file_name, text).items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {term: weight / norm for term, weight in weights.items()} if norm else {}
+
+    def matrix(self, documents):
+        # L2-normalised TF-IDF rows for [(file_name, text), ...] as a sparse matrix
+        for file_name, text in documents:
+            self.update(file_name, text)  # count every document before weighting any of them
+        columns = {}
+        data, indices, indptr = [], [], [0]
+        for file_name, text in documents:
+            for term, weight in self.tfidf_vector(file_name, text).items():
+                indices.append(columns.setdefault(term, len(columns)))
+                data.append(weight)
+            indptr.append(len(indices))
+        return csr_matrix((data, indices, indptr), shape=(len(documents), max(1, len(columns))))
+
+    def save(self):
+        if not self.dirty:
+            return
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"signature": self.signature, "documents": self.documents}, f, ensure_ascii=False)
+        os.replace(self.path + ".tmp", self.path)
+        self.dirty = False
+
+
+class AlbumCentroids:
+    """Per-album sum of member caption vectors, persisted as JSON."""
+
+    def __init__(self, path, vectorizer):
+        self.path = path
+        self.vectorizer = vectorizer
+        self.albums = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("signature") == vectorizer.signature:
+                    self.albums = data["albums"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Rebuilding unreadable album centroids: {e}")
+        self.norms = {}
+
+    def sync(self, album_names, records):
+        # Drop albums that no longer exist and build centroids for ones we have never seen
+        # (e.g. albums created before this feature) from their members' stored captions
+        album_names = set(album_names)
+        for album in list(self.albums):
+            if album not in album_names:
+                del self.albums[album]
+        missing = album_names - set(self.albums)
+        for file_name, (title, description, tags, album) in records.items():
+            if album in missing and title:
+                self.add(album, [self.vectorizer.tf_vector(file_name, caption_text(title, description))])
+        self.norms.clear()
+
+    def add(self, album, vectors):
+        centroid = self.albums.setdefault(album, {"count": 0, "terms": {}})
+        terms = centroid["terms"]
+        for vector in vectors:
+            centroid["count"] += 1
+            for term, weight in vector.items():
+                terms[term] = terms.get(term, 0.0) + weight
+        self.norms.pop(album, None)
+
+    def best_album(self, vector, threshold):
+        # Returns (album, similarity) of the closest centroid at or above threshold, else (None, 0).
+        # `vector` is a TF-IDF vector; centroid terms get their IDF applied here
+        idf = self.vectorizer.idf
+        best, best_score = None, 0.0
+        for album, centroid in self.albums.items():
+            terms = centroid["terms"]
+            dot = sum(weight * terms.get(term, 0.0) * idf(term) for term, weight in vector.items())
+            if dot <= 0:
+                continue
+            norm = self.norms.get(album)
+            if norm is None:
+                norm = self.norms[album] = math.sqrt(sum((weight * idf(term)) ** 2 for term, weight in terms.items()))
+            score = dot / norm
+            if score >= threshold and score > best_score:
+                best, best_score = album, score
+        return best, best_score
+
+    def save(self):
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"signature": self.vectorizer.signature, "albums": self.albums}, f, ensure_ascii=False)
+        os.replace(self.path + ".tmp", self.path)
+
 # === Data Model ===
 class ScreenshotItem:
     def __init__(self, file_name, image_path, title="", description="", tags=None, txt_path=None, album=None):
@@ -110,38 +1517,78 @@ class ScreenshotItem:
 
 # === Core Processing Logic (runs in background thread) ===
 class SnaptureProcessor(threading.Thread):
-    def __init__(self, update_callback):
+    def __init__(self, update_callback, concurrency=None, batch_size=CAPTION_BATCH_SIZE, only_files=None, changed_files=(), store=None):
         super().__init__()
         self.update_callback = update_callback
+        # Watch mode passes just the files that appeared or changed; None scans the whole folder
+        self.only_files = set(only_files) if only_files is not None else None
+        self.changed_files = set(changed_files)
+        # Enough workers for the highest limit the adaptive controller may reach;
+        # the controller itself decides how many of them have a request in flight
+        self.concurrency = max(1, concurrency or int(ai_concurrency.maximum))
+        self.batch_size = max(1, batch_size)
+        self.journal = ProcessingJournal(journal_path)
+        # The GUI shares its catalog connection; without one the processor opens and closes its own
+        self.owns_store = store is None
+        self.store = store if store is not None else MetadataStore(database_path)
+        # Persisted caches, read by load_state() on the worker thread rather than the Tk thread
+        self.caption_cache = None
+        self.vectorizer = None
+        self.centroids = None
+        self.hierarchy = None
         self.screenshot_items = []
         self.clusters = []
         self.cluster_names = []
         self.stop_requested = False
 
     def run(self):
-        # Only process uncategorized screenshots (no TXT or not in any album)
+        try:
+            self.load_state()
+            self._run()
+        finally:
+            self.close()
+
+    def load_state(self):
+        if self.vectorizer is None:
+            self.caption_cache = CaptionCache(caption_cache_path)
+            self.vectorizer = TextVectorizer(text_vectors_path)
+            self.centroids = AlbumCentroids(album_centroids_path, self.vectorizer)
+
+    def close(self):
+        if self.owns_store:
+            self.store.close()
+
+    def _run(self):
+        # Finish a run that was interrupted after clustering before looking for new work
+        self.resume_interrupted_run()
+
+        # Only process uncategorized screenshots (no caption or not in any album)
         self.screenshot_items.clear()
         uncategorized_items = []
-        for file_name in sorted(os.listdir(screenshots_directory)):
-            if not file_name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".webp")):
+        if self.only_files is None:
+            _, album_index = build_album_index(self.store)
+            file_names = library_scanner.list_images(screenshots_directory)
+            records = self.store.all_records()
+        else:
+            # Watch mode only looks at the given files: their catalog rows say which album they are in
+            file_names = [f for f in self.only_files if os.path.exists(os.path.join(screenshots_directory, f))]
+            records = {f: record for f in file_names if (record := self.store.get(f)) is not None}
+            album_index = {
+                f: record[3] for f, record in records.items()
+                if record[3] and (VIRTUAL_ALBUMS or os.path.exists(os.path.join(albums_directory, record[3], f)))
+            }
+        for file_name in sorted(file_names):
+            if not file_name.lower().endswith(IMAGE_EXTENSIONS):
                 continue
 
             image_path = os.path.join(screenshots_directory, file_name)
             txt_file_name = os.path.splitext(file_name)[0] + ".txt"
             txt_file_path = os.path.join(text_files_directory, txt_file_name)
 
-            # If TXT already exists, load it
-            if os.path.exists(txt_file_path):
-                with open(txt_file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                title, description, tags = self.parse_txt(content)
-                # Check if already in an album
-                already_in_album = False
-                for album_folder in os.listdir(albums_directory):
-                    album_path = os.path.join(albums_directory, album_folder)
-                    if os.path.isdir(album_path) and file_name in os.listdir(album_path):
-                        already_in_album = True
-                        break
+            # If metadata already exists, load it (unless the image changed since it was captioned)
+            if file_name in records and file_name not in self.changed_files:
+                title, description, tags, _ = records[file_name]
+                already_in_album = file_name in album_index
                 if title and description and tags and already_in_album:
                     continue  # Already categorized, skip
             else:
@@ -154,80 +1601,232 @@ class SnaptureProcessor(threading.Thread):
             self.update_callback("done", None)
             return
 
-        # Step 1: Caption screenshots and generate TXT files for uncategorized
-        for file_name, image_path, txt_file_path, title, description, tags in uncategorized_items:
-            if not title or not description or not tags:
-                # Caption with AI
-                caption_prompt = (
-                    "You are an AI that captions screenshots.\n"
-                    "Respond EXACTLY as:\n"
-                    "Title: <up to 10 words>\n"
-                    "Description: <1–3 lines>\n"
-                    "Tags: <3–5 comma-separated keywords>\n"
-                )
-                caption_response = call_AI(caption_prompt, image_path)
-                if not caption_response or "Title:" not in caption_response or "Tags:" not in caption_response:
-                    continue
-                title, description, tags = self.parse_caption(caption_response)
-                # Save TXT
-                with open(txt_file_path, "w", encoding="utf-8") as txt_file:
-                    txt_file.write(f"Title:\n{title}\n\n")
-                    txt_file.write(f"Description:\n{description}\n\n")
-                    txt_file.write(f"Tags:\n{', '.join(tags)}")
-
-            item = ScreenshotItem(
-                file_name=file_name,
-                image_path=image_path,
-                title=title,
-                description=description,
-                tags=tags,
-                txt_path=txt_file_path
-            )
-            self.screenshot_items.append(item)
-            self.update_callback("captioned", item)
+        # Step 1: Caption screenshots and store their metadata
+        # (captions of an interrupted run are already in the catalog, so they cost no AI calls)
+        self.journal.start_run()
+        try:
+            self.caption_items(uncategorized_items)
+        finally:
+            self.caption_cache.save()
 
         if not self.screenshot_items:
+            self.journal.finish()
             self.update_callback("error", "No new screenshots to categorize.")
             self.update_callback("done", None)
             return
 
-        # Step 2: Cluster similar captions using TF-IDF + cosine similarity
-        corpus = [item.title + " " + item.description for item in self.screenshot_items]
-        tfidf_matrix = TfidfVectorizer().fit_transform(corpus)
-        similarity_matrix = cosine_similarity(tfidf_matrix)
+        # A changed screenshot that was already filed leaves its old album once it is refiled
+        retired = {}
+        if not VIRTUAL_ALBUMS:
+            for item in self.screenshot_items:
+                if item.file_name in self.changed_files and item.file_name in album_index:
+                    retired.setdefault(album_index[item.file_name], []).append(item.file_name)
+        if retired:
+            self.journal.append("retired", durable=True, albums=retired)
+
+        # Step 2a: Attach screenshots that match an existing album's centroid directly
+        # (IDF comes from every captioned screenshot, not just this run's batch). Watch mode
+        # only adds its own captions; the next full run or re-cut reconciles the rest.
+        if self.only_files is None:
+            records = self.store.all_records()
+            self.vectorizer.refresh(records)
+        else:
+            records = None
+            for item in self.screenshot_items:
+                self.vectorizer.update(item.file_name, caption_text(item.title, item.description))
+        clusters, known_names, leftovers = self.assign_to_existing_albums(records)
+
+        # Step 2b: Cluster the remaining captions using TF-IDF + cosine similarity
+        if leftovers:
+            tfidf_matrix = self.vectorizer.matrix([
+                (self.screenshot_items[i].file_name, caption_text(self.screenshot_items[i].title, self.screenshot_items[i].description))
+                for i in leftovers
+            ])
+            for cluster in leader_clusters(tfidf_matrix, self.store.cluster_threshold()):
+                clusters.append([leftovers[i] for i in cluster])
+        self.clusters = clusters
+        for number, cluster_indices in enumerate(clusters):
+            files = [self.screenshot_items[i].file_name for i in cluster_indices]
+            self.journal.append("clustered", durable=number == len(clusters) - 1, cluster=number, files=files)
+        for number, album in known_names.items():
+            self.journal.append("named", cluster=number, album=album)
+
+        # Steps 3 & 4: Name the new clusters and save everything into album folders
+        self.finish_clusters(clusters, known_names, {}, retired=retired)
+        self.update_callback("done", self.run_summary())
+
+    def recut(self, threshold):
+        try:
+            self.load_state()
+            self.hierarchy = ClusterHierarchy(cluster_hierarchy_path, self.vectorizer)
+            self._recut(threshold)
+        finally:
+            self.close()
+
+    def _recut(self, threshold):
+        # Re-cuts the stored hierarchy at `threshold`, building it first if captions changed
+        # since the last re-cut. Albums whose members stay the same are left alone; changed
+        # clusters are refiled and named (by the AI only if this exact member set was never
+        # named before).
+        records = self.store.all_records()
+        self.vectorizer.refresh(records)
+        self.hierarchy.update(records)
+        self.store.set_meta("cluster_threshold", threshold)
+        # Screenshots whose original is gone only live in their album, so they stay put
+        present = library_scanner.list_images(screenshots_directory)
+        album_files, _ = build_album_index(self.store)
+        current = set()
+        for album, file_names in album_files.items():
+            key = self.hierarchy.members_key([f for f in file_names if f in present])
+            current.add(key)
+            self.hierarchy.names.setdefault(key, album)  # so returning to this cut reuses the name
+        changed = []
+        for cluster in self.hierarchy.cut(threshold):
+            cluster = [file_name for file_name in cluster if file_name in present]
+            if cluster and self.hierarchy.members_key(cluster) not in current:
+                changed.append(cluster)
+        if not changed:
+            self.hierarchy.save()
+            self.vectorizer.save()
+            self.update_callback("info", "Albums already match this threshold.")
+            self.update_callback("done", None)
+            return
+
+        # The screenshots of changed clusters leave their old album folders once they are
+        # filed into the new ones (virtual albums have no files; assign_album moves them)
+        moving = {file_name for cluster in changed for file_name in cluster}
+        reserved = {album for album, file_names in album_files.items() if any(f not in moving for f in file_names)}
+        retired = {}
+        if not VIRTUAL_ALBUMS:
+            for album, file_names in album_files.items():
+                leaving = [file_name for file_name in file_names if file_name in moving]
+                if leaving:
+                    retired[album] = leaving
 
-        threshold = 0.4
+        self.screenshot_items.clear()
         clusters = []
+        known_names = {}
+        for number, cluster in enumerate(changed):
+            cluster_indices = []
+            for file_name in cluster:
+                title, description, tags, _ = records[file_name]
+                txt_file_path = os.path.join(text_files_directory, os.path.splitext(file_name)[0] + ".txt")
+                cluster_indices.append(len(self.screenshot_items))
+                self.screenshot_items.append(ScreenshotItem(
+                    file_name, os.path.join(screenshots_directory, file_name), title, description, tags, txt_file_path))
+            clusters.append(cluster_indices)
+            name = self.hierarchy.names.get(self.hierarchy.members_key(cluster))
+            if name and name not in reserved:
+                known_names[number] = name
+                reserved.add(name)
+
+        # Journal the whole plan before touching any album, so an interrupted re-cut resumes
+        self.journal.start_run()
+        self.journal.append("retired", albums=retired)
+        self.journal.append("reserved", albums=sorted(reserved))
+        for number, cluster_indices in enumerate(clusters):
+            files = [self.screenshot_items[i].file_name for i in cluster_indices]
+            self.journal.append("clustered", durable=number == len(clusters) - 1, cluster=number, files=files)
+        for number, album in known_names.items():
+            self.journal.append("named", cluster=number, album=album)
+        self.finish_clusters(clusters, known_names, {}, reserved, retired)
+
+        for cluster, name in zip(changed, self.cluster_names):
+            self.hierarchy.names[self.hierarchy.members_key(cluster)] = name
+        self.hierarchy.save()
+        # Memberships moved between albums, so rebuild the centroids from scratch
+        album_files, _ = build_album_index(self.store)
+        self.centroids.albums.clear()
+        self.centroids.sync([album for album, file_names in album_files.items() if file_names], self.store.all_records())
+        self.centroids.save()
+        self.update_callback("done", self.run_summary())
+
+    def assign_to_existing_albums(self, records):
+        # Returns (clusters, {cluster number: album}, leftover item indices); the clusters
+        # group the items attached to each existing album. Without `records` (watch mode)
+        # the stored centroids are used as they are, unless there are none yet.
+        if not INCREMENTAL_ALBUMS:
+            return [], {}, list(range(len(self.screenshot_items)))
+        if records is not None or not self.centroids.albums:
+            album_files, _ = build_album_index(self.store)
+            records = records if records is not None else self.store.all_records()
+            self.centroids.sync([album for album, file_names in album_files.items() if file_names], records)
+        threshold = ALBUM_ASSIGN_THRESHOLD if ALBUM_ASSIGN_THRESHOLD is not None else self.store.cluster_threshold()
+        members = {}
+        leftovers = []
         for index, item in enumerate(self.screenshot_items):
-            added = False
-            for cluster in clusters:
-                existing_index = cluster[0]
-                if similarity_matrix[index][existing_index] >= threshold:
-                    cluster.append(index)
-                    added = True
-                    break
-            if not added:
-                clusters.append([index])
-        self.clusters = clusters
-
-        # Step 3: Suggest folder name for each cluster
-        cluster_names = []
-        for cluster_indices in clusters:
-            filenames = [self.screenshot_items[i].file_name for i in cluster_indices]
-            all_tags = sum((self.screenshot_items[i].tags for i in cluster_indices), [])
-            folder_prompt = (
-                "You are a folder-organization expert.\n"
-                "Given these filenames and tags, suggest ONE concise (1–2 word) folder name.\n"
-                f"Files: {filenames}\nTags: {all_tags}\n"
-                "Return just the name."
-            )
-            sample_image_path = self.screenshot_items[cluster_indices[0]].image_path
-            folder_name_response = call_AI(folder_prompt, sample_image_path)
-            if folder_name_response:
-                folder_name = sanitize(folder_name_response.splitlines()[0].split(":", 1)[-1].strip())
+            vector = self.vectorizer.tfidf_vector(item.file_name, caption_text(item.title, item.description))
+            album, _ = self.centroids.best_album(vector, threshold)
+            if album is None:
+                leftovers.append(index)
             else:
-                folder_name = "Uncategorized"
-            cluster_names.append(folder_name)
+                members.setdefault(album, []).append(index)
+        clusters = list(members.values())
+        return clusters, dict(enumerate(members)), leftovers
+
+    def resume_interrupted_run(self):
+        state = self.journal.interrupted_run()
+        if not state or not state["clusters"]:
+            return
+        self.update_callback("info", "Resuming interrupted run...")
+        self.screenshot_items.clear()
+        records = self.store.all_records()
+        clusters = []
+        for number in sorted(state["clusters"]):
+            cluster_indices = []
+            for file_name in state["clusters"][number]:
+                image_path = os.path.join(screenshots_directory, file_name)
+                txt_file_path = os.path.join(text_files_directory, os.path.splitext(file_name)[0] + ".txt")
+                if not os.path.exists(image_path) or file_name not in records:
+                    continue  # removed since the crash
+                title, description, tags, _ = records[file_name]
+                cluster_indices.append(len(self.screenshot_items))
+                self.screenshot_items.append(ScreenshotItem(file_name, image_path, title, description, tags, txt_file_path))
+            clusters.append(cluster_indices)
+        # An album copy whose original is gone since the crash is the only one left, so it stays
+        retired = {
+            album: [f for f in file_names if os.path.exists(os.path.join(screenshots_directory, f))]
+            for album, file_names in state["retired"].items()
+        }
+        # A re-cut journals the albums its new names must not merge into; names given
+        # before the crash are taken as well
+        reserved = state["reserved"]
+        if reserved is not None:
+            reserved |= set(state["names"].values())
+        # Names are keyed by position in `clusters`, which matches the journal numbering
+        self.finish_clusters(clusters, state["names"], state["copied"], reserved, retired)
+
+    def remove_from_albums(self, placements, keep=None):
+        # Deletes the album copies {album: [file names]} and their TXTs, except where
+        # `keep` {file name: album} says the file now belongs to that same album
+        for album, file_names in placements.items():
+            album_path = os.path.join(albums_directory, album)
+            for file_name in file_names:
+                if keep and keep.get(file_name) == album:
+                    continue
+                for path in (os.path.join(album_path, file_name), os.path.join(album_path, os.path.splitext(file_name)[0] + ".txt")):
+                    if os.path.lexists(path):
+                        os.remove(path)
+            if os.path.isdir(album_path) and not os.listdir(album_path):
+                os.rmdir(album_path)
+
+    def finish_clusters(self, clusters, known_names, copied, reserved=None, retired=None):
+        # Step 3: Suggest folder name for each cluster not named before an interruption.
+        # With `reserved`, new names avoid those albums and each other instead of merging.
+        # `retired` {album: [file names]} are old album copies, removed once the new ones exist.
+        self.clusters = clusters
+        unnamed = [number for number in range(len(clusters)) if number not in known_names and clusters[number]]
+        new_names = self.name_clusters([clusters[number] for number in unnamed])
+        cluster_names = [known_names.get(number, "Uncategorized") for number in range(len(clusters))]
+        for number, folder_name in zip(unnamed, new_names):
+            if reserved is not None:
+                folder_name = unique_name(folder_name, reserved)
+                reserved.add(folder_name)
+            cluster_names[number] = folder_name
+            self.journal.append("named", cluster=number, album=folder_name)
+        for cluster_indices, folder_name in zip(clusters, cluster_names):
+            if not cluster_indices:
+                continue
             for idx in cluster_indices:
                 self.screenshot_items[idx].album = folder_name
             self.update_callback("clustered", (folder_name, [self.screenshot_items[i] for i in cluster_indices]))
@@ -235,16 +1834,329 @@ class SnaptureProcessor(threading.Thread):
 
         # Step 4: Save clustered files into folders
         for cluster, folder_name in zip(clusters, cluster_names):
+            if not cluster:
+                continue
             destination_path = os.path.join(albums_directory, folder_name)
-            os.makedirs(destination_path, exist_ok=True)
+            if not VIRTUAL_ALBUMS:
+                os.makedirs(destination_path, exist_ok=True)
             for item_index in cluster:
                 item = self.screenshot_items[item_index]
-                shutil.copy2(item.image_path, os.path.join(destination_path, item.file_name))
-                shutil.copy2(item.txt_path, os.path.join(destination_path, os.path.basename(item.txt_path)))
+                if copied.get(item.file_name) != folder_name:
+                    if not VIRTUAL_ALBUMS:
+                        place_in_album(item.image_path, os.path.join(destination_path, item.file_name))
+                        if EXPORT_TXT_FILES and os.path.exists(item.txt_path):
+                            place_in_album(item.txt_path, os.path.join(destination_path, os.path.basename(item.txt_path)))
+                    self.journal.append("copied", file=item.file_name, album=folder_name)
                 self.update_callback("moved", (item, folder_name))
+            self.store.assign_album([self.screenshot_items[i].file_name for i in cluster], folder_name)
+            self.centroids.add(folder_name, [
+                self.vectorizer.tf_vector(self.screenshot_items[i].file_name, caption_text(self.screenshot_items[i].title, self.screenshot_items[i].description))
+                for i in cluster
+            ])
             self.update_callback("notify_album", folder_name)
+        if retired:
+            placed = {}
+            for cluster, folder_name in zip(clusters, cluster_names):
+                for item_index in cluster:
+                    placed[self.screenshot_items[item_index].file_name] = folder_name
+            self.remove_from_albums(retired, keep=placed)
+        self.centroids.save()
+        self.vectorizer.save()
+        self.journal.finish()
+
+    def caption_items(self, uncategorized_items):
+        # Caption on `concurrency` workers while ai_concurrency caps the requests in flight.
+        # Items are reported as soon as they finish, then put back in scan order so
+        # clustering stays deterministic.
+        results = {}
+        positions, duplicates = self.group_near_duplicates(uncategorized_items)
+        batches = [positions[i:i + self.batch_size] for i in range(0, len(positions), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [
+                executor.submit(self.caption_batch, [(position, uncategorized_items[position]) for position in batch])
+                for batch in batches
+            ]
+            for future in as_completed(futures):
+                try:
+                    captioned = future.result()
+                except Exception as e:
+                    print(f"❌ Captioning failed: {e}")
+                    continue
+                for position, item in captioned:
+                    results[position] = item
+                    self.journal.append("captioned", file=item.file_name)
+                    self.update_callback("captioned", item)
+                if self.stop_requested:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    break
 
-        self.update_callback("done", None)
+        def share_caption(position, caption):
+            entry = uncategorized_items[position]
+            item = self.save_caption(entry, file_hash(entry[1]), *caption)
+            results[position] = item
+            self.journal.append("captioned", file=item.file_name)
+            self.update_callback("captioned", item)
+
+        # Near-duplicates take the caption of their representative (or of the library
+        # screenshot they match) instead of costing a request of their own
+        failed = {}  # source without a caption -> its duplicates
+        for position, source in duplicates.items():
+            if isinstance(source, int):
+                caption = (results[source].title, results[source].description, results[source].tags) if source in results else None
+            else:
+                record = self.store.get(source)
+                caption = record[:3] if record and record[0] else None
+            if caption is None:
+                failed.setdefault(source, []).append(position)
+            else:
+                share_caption(position, caption)
+
+        # When the source has no caption, the next member of the group is captioned instead
+        if failed and not self.stop_requested:
+            stand_ins = [positions[0] for positions in failed.values()]
+            for start in range(0, len(stand_ins), self.batch_size):
+                batch = stand_ins[start:start + self.batch_size]
+                try:
+                    captioned = self.caption_batch([(position, uncategorized_items[position]) for position in batch])
+                except Exception as e:
+                    print(f"❌ Captioning failed: {e}")
+                    continue
+                for position, item in captioned:
+                    results[position] = item
+                    self.journal.append("captioned", file=item.file_name)
+                    self.update_callback("captioned", item)
+            for positions in failed.values():
+                stand_in = results.get(positions[0])
+                if stand_in is not None:
+                    for position in positions[1:]:
+                        share_caption(position, (stand_in.title, stand_in.description, stand_in.tags))
+        skipped = [uncategorized_items[position][0] for position in duplicates if position not in results]
+        if skipped:
+            print(f"⚠️ Skipped {len(skipped)} near-duplicate screenshots without a caption: {', '.join(sorted(skipped))}")
+            self.update_callback("info", f"{len(skipped)} near-duplicate screenshots could not be captioned.")
+        self.screenshot_items.extend(results[position] for position in sorted(results))
+
+    def group_near_duplicates(self, uncategorized_items):
+        # Returns (positions to caption, {duplicate position: source}). The source is the
+        # position of the representative in this run, or the file name of an already
+        # captioned screenshot whose stored hash is within NEAR_DUPLICATE_DISTANCE.
+        positions = list(range(len(uncategorized_items)))
+        if NEAR_DUPLICATE_DISTANCE < 0:
+            return positions, {}
+        stored = self.store.image_hashes(entry[0] for entry in uncategorized_items)
+
+        def current_hash(entry):
+            file_name, image_path = entry[:2]
+            try:
+                stat = os.stat(image_path)
+                cached = stored.get(file_name)
+                if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns) and file_name not in self.changed_files:
+                    return None
+                return file_name, stat.st_size, stat.st_mtime_ns, image_phash(image_path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not hash {file_name}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            fresh = [row for row in executor.map(current_hash, uncategorized_items) if row]
+        if fresh:
+            self.store.save_image_hashes(fresh)
+            for file_name, size, mtime_ns, phash in fresh:
+                stored[file_name] = (size, mtime_ns, phash)
+
+        # Library screenshots are looked up in the store's hash index, this run's
+        # representatives in one of their own
+        index = MultiIndexHash()
+        pending = {entry[0] for entry in uncategorized_items}
+        to_caption = []
+        duplicates = {}
+        for position, entry in enumerate(uncategorized_items):
+            file_name, _, _, title, description, tags = entry
+            if file_name not in stored or stored[file_name][2] is None or (title and description and tags):
+                to_caption.append(position)  # unhashable or flat, or needs no AI call anyway
+                continue
+            phash = stored[file_name][2]
+            source = None
+            for _, match in self.store.near_hashes(phash, NEAR_DUPLICATE_DISTANCE):
+                if match not in pending:
+                    record = self.store.get(match)
+                    if record and record[0]:
+                        source = match
+                        break
+            if source is None:
+                matches = index.query(phash, NEAR_DUPLICATE_DISTANCE)
+                source = matches[0][1] if matches else None
+            if source is not None:
+                duplicates[position] = source
+            else:
+                to_caption.append(position)
+                index.add(phash, position)
+        if duplicates:
+            self.update_callback("info", f"{len(duplicates)} near-duplicate screenshots will reuse an existing caption.")
+        return to_caption, duplicates
+
+    def caption_batch(self, entries):
+        # Resolve what we can locally, send the rest to the AI in one request and
+        # fall back to single-image requests for anything the batch didn't cover.
+        captioned = []
+        pending = []
+        for position, entry in entries:
+            file_name, image_path, txt_file_path, title, description, tags = entry
+            digest = file_hash(image_path)
+            if title and description and tags:
+                # Remember existing captions so copies of this image are never re-captioned
+                self.caption_cache.put(digest, title, description, tags)
+                self.store.save_caption(file_name, title, description, tags, content_hash=digest, image_path=image_path)
+                captioned.append((position, self.make_item(entry, title, description, tags)))
+                continue
+            cached = self.caption_cache.get(digest)
+            if cached:
+                captioned.append((position, self.save_caption(entry, digest, *cached)))
+            else:
+                pending.append((position, entry, digest))
+
+        batch_captions = {}
+        if len(pending) > 1:
+            batch_captions = self.caption_multiple([entry[1] for _, entry, _ in pending])
+        for index, (position, entry, digest) in enumerate(pending):
+            caption = batch_captions.get(index) or self.caption_single(entry[1])
+            if caption is None:
+                continue
+            self.caption_cache.put(digest, *caption)
+            captioned.append((position, self.save_caption(entry, digest, *caption)))
+        return captioned
+
+    def caption_single(self, image_path):
+        caption_prompt = (
+            "You are an AI that captions screenshots.\n"
+            "Respond EXACTLY as:\n"
+            "Title: <up to 10 words>\n"
+            "Description: <1–3 lines>\n"
+            "Tags: <3–5 comma-separated keywords>\n"
+        )
+        caption_response = call_AI(caption_prompt, image_path)
+        if not caption_response or "Title:" not in caption_response or "Tags:" not in caption_response:
+            return None
+        return self.parse_caption(caption_response)
+
+    def caption_multiple(self, image_paths):
+        # One request carrying every image, each introduced by its number
+        caption_prompt = (
+            "You are an AI that captions screenshots.\n"
+            f"You are given {len(image_paths)} screenshots, each preceded by a line 'Image <number>'.\n"
+            "Respond with ONLY a JSON array containing one object per screenshot:\n"
+            '[{"image": <number>, "title": "<up to 10 words>", "description": "<1–3 lines>", '
+            '"tags": ["<3–5 keywords>"]}]\n'
+        )
+        parts = [{"text": caption_prompt}]
+        for number, image_path in enumerate(image_paths, start=1):
+            parts.append({"text": f"Image {number}"})
+            parts.append(image_part(image_path))
+        response = post_AI(parts)
+        return self.parse_batch_caption(response, len(image_paths)) if response else {}
+
+    @staticmethod
+    def parse_batch_caption(response, count):
+        # Maps 0-based image index -> (title, description, tags) for every well-formed entry
+        start, end = response.find("["), response.rfind("]")
+        if start < 0 or end < start:
+            return {}
+        try:
+            entries = json.loads(response[start:end + 1])
+        except ValueError:
+            return {}
+        captions = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                index = int(entry.get("image")) - 1
+            except (TypeError, ValueError):
+                continue
+            title = str(entry.get("title") or "").strip()
+            description = str(entry.get("description") or "").strip()
+            tags = entry.get("tags") or []
+            if isinstance(tags, str):
+                tags = tags.split(",")
+            tags = [str(tag).strip() for tag in tags if str(tag).strip()]
+            if 0 <= index < count and title and tags:
+                captions[index] = (title, description, tags)
+        return captions
+
+    def save_caption(self, entry, digest, title, description, tags):
+        file_name, image_path, txt_file_path = entry[:3]
+        self.store.save_caption(file_name, title, description, tags, content_hash=digest, image_path=image_path)
+        if EXPORT_TXT_FILES:
+            write_txt(txt_file_path, title, description, tags)
+        return self.make_item(entry, title, description, tags)
+
+    @staticmethod
+    def make_item(entry, title, description, tags):
+        file_name, image_path, txt_file_path = entry[:3]
+        return ScreenshotItem(
+            file_name=file_name,
+            image_path=image_path,
+            title=title,
+            description=description,
+            tags=tags,
+            txt_path=txt_file_path
+        )
+
+    def name_clusters(self, clusters):
+        # Batch mode names every cluster in one text-only request; only clusters the
+        # response leaves out get the per-cluster request with a sample image.
+        batch_names = {}
+        if ALBUM_NAMING_MODE == "batch" and clusters:
+            batch_names = self.name_clusters_batch(clusters)
+        return [batch_names.get(number) or self.name_cluster(cluster_indices)
+                for number, cluster_indices in enumerate(clusters, start=1)]
+
+    def name_cluster(self, cluster_indices):
+        filenames = [self.screenshot_items[i].file_name for i in cluster_indices]
+        all_tags = sum((self.screenshot_items[i].tags for i in cluster_indices), [])
+        folder_prompt = (
+            "You are a folder-organization expert.\n"
+            "Given these filenames and tags, suggest ONE concise (1–2 word) folder name.\n"
+            f"Files: {filenames}\nTags: {all_tags}\n"
+            "Return just the name."
+        )
+        sample_image_path = self.screenshot_items[cluster_indices[0]].image_path
+        folder_name_response = call_AI(folder_prompt, sample_image_path)
+        if folder_name_response:
+            return sanitize(folder_name_response.splitlines()[0].split(":", 1)[-1].strip())
+        return "Uncategorized"
+
+    def name_clusters_batch(self, clusters, max_files=10, max_tags=15):
+        # Returns {1-based cluster number: folder name} for every line the AI answered
+        group_lines = []
+        for number, cluster_indices in enumerate(clusters, start=1):
+            filenames = [self.screenshot_items[i].file_name for i in cluster_indices[:max_files]]
+            tag_counts = Counter(tag.lower() for i in cluster_indices for tag in self.screenshot_items[i].tags)
+            top_tags = [tag for tag, _ in tag_counts.most_common(max_tags)]
+            group_lines.append(f"Group {number}: Files: {filenames} Tags: {top_tags}")
+        folder_prompt = (
+            "You are a folder-organization expert.\n"
+            "For each numbered group of screenshots below, suggest ONE concise (1–2 word) folder name "
+            "based on its filenames and tags.\n"
+            "Respond with one line per group, EXACTLY as:\n"
+            "<number>: <name>\n\n"
+            + "\n".join(group_lines)
+        )
+        response = post_AI([{"text": folder_prompt}])
+        names = {}
+        for line in (response or "").splitlines():
+            match = re.match(r"\s*(?:group\s*)?(\d+)\s*[:.)-]\s*(.+)", line, re.IGNORECASE)
+            if match and 1 <= int(match.group(1)) <= len(clusters):
+                name = sanitize(match.group(2).strip().strip("*\"'`"))
+                if name != "Uncategorized":
+                    names.setdefault(int(match.group(1)), name)
+        return names
+
+    def run_summary(self):
+        summary = " ".join(filter(None, [self.caption_cache.summary(), ai_concurrency.summary()]))
+        if summary:
+            print(summary)
+        return summary
 
     def parse_caption(self, caption_response):
         lines = caption_response.splitlines()
@@ -278,12 +2190,550 @@ class SnaptureProcessor(threading.Thread):
             i += 1
         return title, description, tags
 
+# === Screenshot Watcher ===
+class InotifyWatch:
+    """Minimal ctypes binding to Linux inotify for one directory."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, directory):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify is not available on this platform")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, "inotify_add_watch failed")
+
+    def read(self, timeout):
+        # Returns (file names touched, overflowed) for events that arrive within `timeout`
+        names = set()
+        overflowed = False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return names, overflowed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names, overflowed
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            _, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                overflowed = True
+            elif name:
+                names.add(os.fsdecode(name))
+        return names, overflowed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ScreenshotWatcher(threading.Thread):
+    """Reports added, changed and deleted screenshots via inotify, or by polling (size, mtime)."""
+
+    def __init__(self, directory, on_changes, poll_interval=WATCH_POLL_INTERVAL, settle_delay=WATCH_SETTLE_DELAY):
+        super().__init__(daemon=True)
+        self.directory = directory
+        self.on_changes = on_changes
+        self.poll_interval = poll_interval
+        self.settle_delay = settle_delay
+        self.stop_event = threading.Event()
+        self.backend = None
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self, names=None):
+        # {file name: (size, mtime)} for the given names, or the whole folder
+        snapshot = {}
+        if names is None:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+            return snapshot
+        for name in names:
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            snapshot[name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def apply(self, current, names):
+        # Diffs `current` against the known snapshot for `names` and reports any changes
+        changes = {"added": set(), "changed": set(), "deleted": set()}
+        for name in names:
+            before, after = self.snapshot.get(name), current.get(name)
+            if before is None and after is not None:
+                changes["added"].add(name)
+            elif before is not None and after is None:
+                changes["deleted"].add(name)
+            elif before != after:
+                changes["changed"].add(name)
+            if after is None:
+                self.snapshot.pop(name, None)
+            else:
+                self.snapshot[name] = after
+        if any(changes.values()):
+            self.on_changes(changes)
+
+    def run(self):
+        try:
+            watch = InotifyWatch(self.directory)
+            self.backend = "inotify"
+        except (OSError, AttributeError):
+            watch = None
+            self.backend = "polling"
+        try:
+            if watch:
+                self.watch_inotify(watch)
+            else:
+                self.watch_polling()
+        finally:
+            if watch:
+                watch.close()
+
+    def watch_inotify(self, watch):
+        while not self.stop_event.is_set():
+            names, overflowed = watch.read(timeout=0.5)
+            if not names and not overflowed:
+                continue
+            # Let a burst (e.g. a folder of screenshots being pasted) settle into one batch
+            deadline = time.monotonic() + self.settle_delay
+            while time.monotonic() < deadline:
+                more, more_overflowed = watch.read(timeout=max(0.0, deadline - time.monotonic()))
+                names |= more
+                overflowed = overflowed or more_overflowed
+            if overflowed:
+                # The kernel dropped events: fall back to one full comparison
+                current = self.take_snapshot()
+                self.apply(current, set(current) | set(self.snapshot))
+            else:
+                self.apply(self.take_snapshot(names), names)
+
+    def watch_polling(self):
+        unstable = {}
+        while not self.stop_event.wait(self.poll_interval):
+            current = self.take_snapshot()
+            names = {name for name in set(current) | set(self.snapshot) if current.get(name) != self.snapshot.get(name)}
+            # A file still being written shows a different size/mtime on every poll; wait until it stops
+            settled = {name for name in names if name not in current or unstable.get(name) == current[name]}
+            unstable = {name: current[name] for name in names - settled}
+            if settled:
+                self.apply(current, settled)
+
+    def stop(self):
+        self.stop_event.set()
+
+# === Catalog Snapshot ===
+# Header: magic + Python major/minor, since marshal's format is tied to the interpreter version
+CATALOG_SNAPSHOT_HEADER = b"SNAPCAT1" + bytes(sys.version_info[:2])
+
+
+def catalog_rows(all_screenshots):
+    # Flat, marshal-friendly form of the in-memory catalog
+    return [
+        (item.file_name, item.image_path, item.title, item.description, tuple(item.tags), item.txt_path, item.album)
+        for item in all_screenshots
+    ]
+
+
+def save_catalog_snapshot(path, all_screenshots):
+    data = marshal.dumps(catalog_rows(all_screenshots))
+    with open(path + ".tmp", "wb") as f:
+        f.write(CATALOG_SNAPSHOT_HEADER)
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def load_catalog_snapshot(path):
+    # Returns (albums, album_order, all_screenshots) or None if missing/incompatible
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(CATALOG_SNAPSHOT_HEADER)] != CATALOG_SNAPSHOT_HEADER:
+                return None
+            with memoryview(mapped)[len(CATALOG_SNAPSHOT_HEADER):] as view:
+                rows = marshal.loads(view)
+        # A truncated or differently shaped snapshot falls back to the directory scan too
+        albums = {}
+        all_screenshots = []
+        for file_name, image_path, title, description, tags, txt_path, album in rows:
+            item = ScreenshotItem(file_name, image_path, title, description, list(tags), txt_path, album)
+            all_screenshots.append(item)
+            if album:
+                albums.setdefault(album, []).append(item)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    return albums, list(albums), all_screenshots
+
+# === Search Index ===
+def search_fields(item):
+    return (
+        item.title or "",
+        item.description or "",
+        " ".join(item.tags) if item.tags else "",
+        item.album or "",
+        os.path.splitext(item.file_name)[0],
+    )
+
+
+def trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a, b, limit):
+    # Levenshtein distance of a and b, or limit + 1 as soon as it must exceed limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+class SearchIndex:
+    """Inverted token index for prefix, typo-tolerant and BM25F-ranked search."""
+
+    TOKEN = re.compile(r"[^\W_]+")
+
+    def __init__(self, weights=SEARCH_FIELD_WEIGHTS):
+        # Searches run on a worker thread while the Tk thread keeps the index up to date
+        self.lock = threading.RLock()
+        self.weights = weights
+        self.entries = {}  # key -> [fields, value, tokens, tokens of each field]
+        self.field_totals = [0] * len(weights)  # summed field lengths, for average lengths
+        self.order = {}  # key -> position used to order results
+        self.postings = {}  # token -> set of keys
+        self.terms = []  # sorted distinct tokens, rebuilt lazily after changes
+        self.terms_stale = False
+        self.trigram_terms = {}  # trigram -> set of tokens containing it
+        self.next_order = 0
+
+    @classmethod
+    def tokenize(cls, text):
+        return cls.TOKEN.findall(text.lower())
+
+    def update(self, key, fields, value, order=None):
+        with self.lock:
+            self._update(key, fields, value, order)
+
+    def _update(self, key, fields, value, order):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == fields:
+            entry[1] = value
+        else:
+            if entry is not None:
+                self._unindex(key, entry)
+            # Interned, so the per-field token lists kept for scoring share the strings
+            field_tokens = tuple(tuple(map(sys.intern, self.tokenize(field))) for field in fields)
+            for number, field in enumerate(field_tokens):
+                self.field_totals[number] += len(field)
+            tokens = set().union(*field_tokens)
+            postings = self.postings
+            for token in tokens:
+                keys = postings.get(token)
+                if keys is None:
+                    postings[token] = {key}
+                    self.terms_stale = True
+                    for trigram in trigrams(token):
+                        self.trigram_terms.setdefault(trigram, set()).add(token)
+                else:
+                    keys.add(key)
+            self.entries[key] = [fields, value, tokens, field_tokens]
+        if order is not None:
+            self.order[key] = order
+            self.next_order = max(self.next_order, order + 1)
+        elif key not in self.order:
+            self.order[key] = self.next_order
+            self.next_order += 1
+
+    def remove(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self._unindex(key, entry)
+                del self.order[key]
+
+    def _unindex(self, key, entry):
+        for number, field in enumerate(entry[3]):
+            self.field_totals[number] -= len(field)
+        for token in entry[2]:
+            keys = self.postings[token]
+            keys.discard(key)
+            if not keys:
+                del self.postings[token]
+                self.terms_stale = True
+                for trigram in trigrams(token):
+                    terms = self.trigram_terms[trigram]
+                    terms.discard(token)
+                    if not terms:
+                        del self.trigram_terms[trigram]
+
+    def sync(self, entries):
+        # Makes the index hold exactly `entries` [(key, fields, value)], in that order; only
+        # entries that are new or changed are re-tokenised. The first entry for a key wins.
+        seen = set()
+        with self.lock:
+            for position, (key, fields, value) in enumerate(entries):
+                if key not in seen:
+                    seen.add(key)
+                    self._update(key, fields, value, position)
+            for key in [key for key in self.entries if key not in seen]:
+                self.remove(key)
+
+    def prefix_terms(self, prefix):
+        if self.terms_stale:
+            self.terms = sorted(self.postings)
+            self.terms_stale = False
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + "\U0010ffff", start)
+        return self.terms[start:end]
+
+    def fuzzy_terms(self, word, max_distance=SEARCH_FUZZY_MAX_DISTANCE):
+        # Indexed tokens within max_distance edits of word (fewer for short words). Each edit
+        # destroys at most 3 of the word's trigrams, so a match shares all but 3 * distance
+        # of them; only tokens passing that filter are verified.
+        limit = min(max_distance, 1 if len(word) < 6 else 2)
+        if len(word) < 4 or limit == 0:
+            return []
+        grams = trigrams(word)
+        shared = Counter()
+        for trigram in grams:
+            shared.update(self.trigram_terms.get(trigram, ()))
+        required = max(1, len(grams) - 3 * limit)
+        return [
+            term for term, count in shared.items()
+            if count >= required and bounded_edit_distance(word, term, limit) <= limit
+        ]
+
+    def search(self, query, cancelled=None, limit=None, ranked=True, restrict=None):
+        # Values whose tokens start with every word of the query: the `limit` best ranked
+        # ones, or all of them in catalog order when not ranked. With `restrict`, only keys
+        # in that set can match, and it is intersected before anything is scored.
+        # Returns None as soon as `cancelled()` reports that nobody wants the result any more.
+        words = set(self.tokenize(query))
+        if not words or restrict is not None and not restrict:
+            return []
+        with self.lock:
+            matches = restrict
+            expansions = {}  # query word -> (tokens it matches, score factor)
+            for word in sorted(words, key=len, reverse=True):  # longer prefixes usually match fewer keys
+                if cancelled is not None and cancelled():
+                    return None
+                keys = set()
+                terms = self.prefix_terms(word)
+                expansions[word] = (terms, 1.0)
+                if not terms:
+                    terms = self.fuzzy_terms(word)
+                    expansions[word] = (terms, 0.5)  # typo matches rank below exact ones
+                for term in terms:
+                    keys |= self.postings[term]
+                matches = keys if matches is None else matches & keys
+                if not matches:
+                    return []
+            if not ranked:
+                return [self.entries[key][1] for key in sorted(matches, key=self.order.__getitem__)]
+            documents = len(self.entries)
+            term_words = {}  # token -> (query words it matches, idf)
+            for word, (terms, factor) in expansions.items():
+                for term in terms:
+                    df = len(self.postings[term])
+                    idf = factor * math.log(1 + (documents - df + 0.5) / (df + 0.5))
+                    term_words.setdefault(term, ([], idf))[0].append(word)
+            scores = {}
+            for number, key in enumerate(matches):
+                if number % 1024 == 0 and cancelled is not None and cancelled():
+                    return None
+                scores[key] = self.score(key, term_words)
+            ranking = lambda key: (-scores[key], self.order[key])  # ties keep catalog order
+            best = heapq.nsmallest(limit, matches, key=ranking) if limit else sorted(matches, key=ranking)
+            return [self.entries[key][1] for key in best]
+
+    def score(self, key, term_words):
+        # BM25F: per-field term counts are length-normalised, weighted and summed before
+        # saturation. A query word scores through the best-scoring token it is a prefix of.
+        # term_words maps each matching token to (the query words it matches, its idf).
+        field_tokens = self.entries[key][3]
+        documents = len(self.entries)
+        tf = {}
+        for field, weight, total in zip(field_tokens, self.weights, self.field_totals):
+            norm = 1 - BM25_B + BM25_B * len(field) * documents / total if total else 1.0
+            for token in field:
+                if token in term_words:
+                    tf[token] = tf.get(token, 0.0) + weight / norm
+        best = {}
+        for token, frequency in tf.items():
+            words, idf = term_words[token]
+            value = idf * frequency / (BM25_K1 + frequency)
+            for word in words:
+                if value > best.get(word, 0.0):
+                    best[word] = value
+        return sum(best.values())
+
+
+def popcount(bits):
+    return bin(bits).count("1")
+
+
+class FacetIndex:
+    """Tag and album facets of the screenshots, kept as bitmaps with their counts."""
+
+    FACETS = ("tag", "album")
+
+    def __init__(self):
+        # Searches decode selections on the search worker while the Tk thread keeps the index up to date
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self.positions = {}  # key -> bit position
+        self.slots = []  # bit position -> (key, value), None once removed
+        self.live = 0  # bits of the positions in use
+        self.facets = {facet: {} for facet in self.FACETS}  # facet -> value -> [label, bitmap, count]
+        self.entries = {}  # key -> {(facet, value): label} it is indexed under
+
+    @staticmethod
+    def facet_values(item):
+        # Tags match case-insensitively and keep the spelling they were first seen with
+        values = {("tag", tag.strip().lower()): tag.strip() for tag in item.tags or () if tag.strip()}
+        if item.album:
+            values[("album", item.album)] = item.album
+        return values
+
+    def update(self, key, value):
+        with self.lock:
+            self._update(key, value)
+
+    def _update(self, key, value):
+        values = self.facet_values(value)
+        position = self.positions.get(key)
+        if position is None:
+            position = self.positions[key] = len(self.slots)
+            self.slots.append(None)
+            self.live |= 1 << position
+        self.slots[position] = (key, value)
+        bit = 1 << position
+        previous = self.entries.get(key, {})
+        for facet, facet_value in previous.keys() - values.keys():
+            self._clear(facet, facet_value, bit)
+        for (facet, facet_value), label in values.items():
+            if (facet, facet_value) not in previous:
+                entry = self.facets[facet].setdefault(facet_value, [label, 0, 0])
+                entry[1] |= bit
+                entry[2] += 1
+        self.entries[key] = values
+
+    def _clear(self, facet, facet_value, bit):
+        entry = self.facets[facet][facet_value]
+        entry[1] &= ~bit
+        entry[2] -= 1
+        if not entry[2]:
+            del self.facets[facet][facet_value]
+
+    def remove(self, key):
+        with self.lock:
+            position = self.positions.pop(key, None)
+            if position is None:
+                return
+            bit = 1 << position
+            for facet, facet_value in self.entries.pop(key):
+                self._clear(facet, facet_value, bit)
+            self.slots[position] = None
+            self.live &= ~bit
+
+    def sync(self, entries):
+        # Rebuilds the index from (key, value) pairs, numbered in that order; the first entry
+        # for a key wins. Bitmaps are assembled as bytes, not grown one bit at a time.
+        with self.lock:
+            self.clear()
+            members = {}  # (facet, value) -> positions
+            for key, value in entries:
+                if key in self.positions:
+                    continue
+                position = self.positions[key] = len(self.slots)
+                self.slots.append((key, value))
+                values = self.entries[key] = self.facet_values(value)
+                for facet_key, label in values.items():
+                    members.setdefault(facet_key, (label, []))[1].append(position)
+            size = (len(self.slots) + 7) // 8
+            self.live = (1 << len(self.slots)) - 1
+            for (facet, facet_value), (label, positions) in members.items():
+                bits = bytearray(size)
+                for position in positions:
+                    bits[position >> 3] |= 1 << (position & 7)
+                self.facets[facet][facet_value] = [label, int.from_bytes(bits, "little"), len(positions)]
+
+    def mask(self, selected):
+        # Bits of the screenshots that have every selected (facet, value)
+        mask = self.live
+        for facet, facet_value in selected:
+            entry = self.facets[facet].get(facet_value)
+            if entry is None:
+                return 0
+            mask &= entry[1]
+        return mask
+
+    def count(self, facet, facet_value, mask=None):
+        entry = self.facets[facet].get(facet_value)
+        if entry is None:
+            return 0
+        return entry[2] if mask is None else popcount(entry[1] & mask)
+
+    def counts(self, facet, mask=None, limit=None):
+        # [(value, label, count)] with a non-zero count, most frequent first; counts are the
+        # precomputed totals, or only cover the screenshots in mask when one is given
+        counted = [
+            (facet_value, label, count if mask is None else popcount(bits & mask))
+            for facet_value, (label, bits, count) in self.facets[facet].items()
+        ]
+        counted = [entry for entry in counted if entry[2]]
+        ranking = lambda entry: (-entry[2], entry[1].lower())
+        return heapq.nsmallest(limit, counted, key=ranking) if limit else sorted(counted, key=ranking)
+
+    def _slots(self, mask):
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+        for number, byte in enumerate(data):
+            if byte:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield self.slots[number * 8 + bit]
+
+    def items(self, mask):
+        # Values of the screenshots in mask, in catalog order
+        return [value for _, value in self._slots(mask)]
+
+    def keys(self, mask):
+        return {key for key, _ in self._slots(mask)}
+
 # === GUI ===
 class SnaptureGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Snapture 4.0 — Screenshot Organizer")
         self.root.geometry("1100x700")
+        # Narrow enough for small screens, wide enough for the search bar and the filter row
+        self.root.minsize(840, 480)
         self.root.configure(bg="#f7f7fa")
         self.screenshot_items = []
         self.albums = {}
@@ -370,6 +2820,9 @@ class SnaptureGUI:
         self.play_button_label.place(relx=1.0, rely=0.0, anchor="ne", x=-20, y=5)
         self.play_button_label.bind("<Button-1>", lambda e: self.start_processing())
 
+        # Album similarity, shown as a slider next to the filter chips
+        self.threshold_var = tk.DoubleVar(value=CLUSTER_THRESHOLD)
+
         # Position all search bar widgets after play button is created
         self._position_searchbar_widgets()
 
@@ -400,8 +2853,35 @@ class SnaptureGUI:
         # For album view
         self.album_windows = {}
 
-        # Load all screenshots and albums on startup
-        self.load_all_data()
+        # Metadata catalog (imports existing TXTs on first start)
+        self.store = MetadataStore(database_path)
+        self.search_index = SearchIndex()
+        self.album_search_index = SearchIndex(weights=(1.0,))
+        # Tag and album filters selected in the filter bar, as (facet, value)
+        self.facet_index = FacetIndex()
+        self.active_facets = set()
+        # Lookups run on one worker; a newer query bumps the generation so stale results are dropped
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
+        self._search_generation = 0
+        self._search_after_id = None
+        self.threshold_var.set(self.store.cluster_threshold())
+
+        # Show the catalog saved at last exit right away, then reconcile it with the disk
+        # in the background; without a snapshot, load everything synchronously
+        snapshot = load_catalog_snapshot(catalog_snapshot_path)
+        if snapshot:
+            self.apply_catalog(*snapshot)
+            self._validate_catalog()
+        else:
+            self.load_all_data()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Optionally watch the Screenshots folder and process new files as they arrive
+        self.pending_changes = {"added": set(), "changed": set(), "deleted": set()}
+        self.watcher = None
+        if WATCH_SCREENSHOTS:
+            self.watcher = ScreenshotWatcher(screenshots_directory, lambda changes: self.root.after(0, self._on_screenshots_changed, changes))
+            self.watcher.start()
 
         # Responsive grid: update on resize
         self.root.bind("<Configure>", self._on_root_resize)
@@ -510,6 +2990,96 @@ class SnaptureGUI:
             # Store reference to update styling
             setattr(self, f'filter_chip_{option.lower()}', chip)
 
+        # Album similarity slider: releasing it re-cuts the stored clustering hierarchy
+        threshold_label = tk.Label(self.filter_chips_frame, text="Album similarity", font=("Segoe UI", 9), bg="#f7f7fa", fg="#666666")
+        threshold_label.pack(side="left", padx=(16, 4))
+        self.threshold_scale = tk.Scale(
+            self.filter_chips_frame, variable=self.threshold_var, from_=0.1, to=0.9, resolution=0.05,
+            orient="horizontal", length=120, font=("Segoe UI", 8), sliderlength=16,
+            bg="#f7f7fa", highlightthickness=0, bd=0, troughcolor="#e0e7ef"
+        )
+        self.threshold_scale.pack(side="left")
+        self.threshold_scale.bind("<ButtonRelease-1>", lambda e: self.start_recut(self.threshold_var.get()))
+
+        self._create_facet_chips()
+
+    def _create_facet_chips(self):
+        """Create a row of tag and album chips with live counts below the filter chips"""
+        if not hasattr(self, 'facet_index'):
+            return
+        rows = self._facet_chip_rows()
+        if hasattr(self, 'facet_chips_frame'):
+            if rows == self._facet_chip_rows_shown:
+                # Nothing changed; just keep the row below the (possibly recreated) filter chips
+                self.facet_chips_frame.pack(side="top", pady=(5, 0), after=self.filter_chips_frame)
+                return
+            self.facet_chips_frame.destroy()
+        self.facet_chips_frame = tk.Frame(self.topbar_frame, bg="#f7f7fa")
+        self.facet_chips_frame.pack(side="top", pady=(5, 0), after=self.filter_chips_frame)
+        self._facet_chip_rows_shown = rows
+
+        for facet, prefix, chips in rows:
+            row_frame = tk.Frame(self.facet_chips_frame, bg="#f7f7fa")
+            row_frame.pack(side="top", pady=(0, 4))
+            for facet_value, label, count, selected in chips:
+                chip = tk.Button(
+                    row_frame,
+                    text=f"{prefix}{label} ({count})",
+                    font=("Segoe UI", 9),
+                    bd=0,
+                    relief="flat",
+                    bg="#4a90e2" if selected else "#f0f0f0",
+                    fg="white" if selected else "#666666",
+                    activebackground="#e0e7ef",
+                    activeforeground="#222222",
+                    cursor="hand2",
+                    highlightthickness=0,
+                    padx=10,
+                    pady=2,
+                    command=lambda f=facet, v=facet_value: self._on_facet_chip_click(f, v)
+                )
+                chip.pack(side="left", padx=(0, 6))
+
+    def _facet_chip_rows(self):
+        # [(facet, label prefix, [(value, label, count, selected)])]. Selected facets stay
+        # visible; the rest are the most frequent within the current selection.
+        rows = []
+        mask = self._facet_mask()
+        for facet, prefix in (("tag", "#"), ("album", "Album: ")):
+            chips = []
+            for active_facet, facet_value in sorted(self.active_facets):
+                if active_facet == facet:
+                    entry = self.facet_index.facets[facet].get(facet_value)
+                    label = entry[0] if entry else facet_value
+                    chips.append((facet_value, label, self.facet_index.count(facet, facet_value, mask), True))
+            chips += [
+                (facet_value, label, count, False)
+                for facet_value, label, count in self.facet_index.counts(facet, mask, FACET_CHIP_LIMIT + len(chips))
+                if (facet, facet_value) not in self.active_facets
+            ][:FACET_CHIP_LIMIT]
+            if chips:
+                rows.append((facet, prefix, chips))
+        return rows
+
+    def _on_facet_chip_click(self, facet, facet_value):
+        """Toggle a tag or album filter"""
+        self.active_facets ^= {(facet, facet_value)}
+        self._create_facet_chips()
+        if self.search_var.get().strip():
+            self._on_search_enter()
+        else:
+            self.update_main_page()
+
+    def _facet_mask(self):
+        # Bitmap of the screenshots matching every selected facet, or None when nothing is selected
+        return self.facet_index.mask(self.active_facets) if self.active_facets else None
+
+    def _faceted_albums(self, mask):
+        # Albums with at least one screenshot in mask
+        if mask is None:
+            return self.album_order
+        return [album_name for album_name in self.album_order if self.facet_index.count("album", album_name, mask)]
+
     def _on_filter_chip_click(self, option):
         """Handle filter chip clicks"""
         # Update search type
@@ -557,32 +3127,59 @@ class SnaptureGUI:
         # Update search button state
         self._update_search_button_state()
         
-        suggestions = []
+        if getattr(event, "keysym", None) in ("Up", "Down"):
+            return  # moving through the suggestions, the query did not change
+        # Only look up suggestions once typing pauses
+        if self._search_after_id is not None:
+            self.root.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        # Any search still running is for an older query; drop its results
+        self._search_generation += 1
         if not query:
             self.suggestion_box.place_forget()
             return
-        # Gather all possible search targets, no duplicates
-        screenshot_targets = []
-        seen_screenshots = set()
-        for item in self.all_screenshots:
-            unique_id = item.file_name
-            fields = [
-                item.title.lower() if item.title else "",
-                item.description.lower() if item.description else "",
-                " ".join(item.tags).lower() if item.tags else "",
-                item.album.lower() if item.album else "",
-                os.path.splitext(item.file_name)[0].lower()
-            ]
-            if any(query in f for f in fields):
-                if unique_id not in seen_screenshots:
-                    screenshot_targets.append(item)
-                    seen_screenshots.add(unique_id)
-        album_targets = []
-        seen_albums = set()
-        for album_name in self.album_order:
-            if query in album_name.lower() and album_name not in seen_albums:
-                album_targets.append(album_name)
-                seen_albums.add(album_name)
+        self._search_after_id = self.root.after(
+            SEARCH_DEBOUNCE_MS, self._start_search, query, search_type, self._show_suggestions, 10)
+
+    def _start_search(self, query, search_type, on_results, limit=SEARCH_RESULT_LIMIT):
+        # Runs the lookup on the search worker and hands the results to on_results on the Tk thread,
+        # unless another search started in the meantime
+        self._search_after_id = None
+        self._search_generation += 1
+        generation = self._search_generation
+
+        def cancelled():
+            return generation != self._search_generation
+
+        # Selected facets narrow the candidates before the text lookup ranks them
+        selected = frozenset(self.active_facets)
+
+        def worker():
+            screenshot_keys = album_keys = None
+            if selected:
+                with self.facet_index.lock:
+                    mask = self.facet_index.mask(selected)
+                    screenshot_keys = self.facet_index.keys(mask)
+                    album_keys = set(self._faceted_albums(mask))
+            # Every word of the query must start a word of the title, description, tags, album or filename
+            ranked = SEARCH_RANKING == "bm25"
+            screenshot_results = album_results = []
+            if search_type in ("All", "Screenshots"):
+                screenshot_results = self.search_index.search(query, cancelled, limit, ranked, screenshot_keys)
+            if search_type in ("All", "Albums"):
+                album_results = self.album_search_index.search(query, cancelled, limit, ranked, album_keys)
+            if screenshot_results is None or album_results is None or cancelled():
+                return
+            self.root.after(0, finish, screenshot_results, album_results)
+
+        def finish(screenshot_results, album_results):
+            if not cancelled():
+                on_results(search_type, screenshot_results, album_results)
+
+        self.search_executor.submit(worker)
+
+    def _show_suggestions(self, search_type, screenshot_targets, album_targets):
+        suggestions = []
         # Build suggestions based on current filter
         if search_type in ("All", "Screenshots"):
             for item in screenshot_targets:
@@ -645,109 +3242,183 @@ class SnaptureGUI:
         
         query = self.search_var.get().strip().lower()
         search_type = self.search_type_var.get()
-        screenshot_results = []
-        album_results = []
-        seen_screenshots = set()
-        seen_albums = set()
+        if self._search_after_id is not None:
+            self.root.after_cancel(self._search_after_id)
+            self._search_after_id = None
         if not query:
+            self._search_generation += 1
             self.search_results = []
             self.update_main_page()
             return
-        # Search screenshots (no duplicates)
-        if search_type in ("All", "Screenshots"):
-            for item in self.all_screenshots:
-                unique_id = item.file_name
-                fields = [
-                    item.title.lower() if item.title else "",
-                    item.description.lower() if item.description else "",
-                    " ".join(item.tags).lower() if item.tags else "",
-                    item.album.lower() if item.album else "",
-                    os.path.splitext(item.file_name)[0].lower()
-                ]
-                if any(query in f for f in fields):
-                    if unique_id not in seen_screenshots:
-                        screenshot_results.append(item)
-                        seen_screenshots.add(unique_id)
-        # Search albums (no duplicates)
-        if search_type in ("All", "Albums"):
-            for album_name in self.album_order:
-                if query in album_name.lower() and album_name not in seen_albums:
-                    album_results.append(album_name)
-                    seen_albums.add(album_name)
+        self._start_search(query, search_type, self._show_search_results)
+
+    def _show_search_results(self, search_type, screenshot_results, album_results):
         self.search_results = (screenshot_results, album_results)
         self.update_main_page(search_mode=True)
 
     def load_all_data(self):
+        self.apply_catalog(*self.build_catalog())
+
+    def build_catalog(self):
+        # Reads albums and screenshots from disk and the catalog; safe to call off the Tk thread
         # Load albums and their screenshots if already categorized
-        self.albums = {}
-        self.album_order = []
-        for album_folder in sorted(os.listdir(albums_directory)):
-            album_path = os.path.join(albums_directory, album_folder)
-            if not os.path.isdir(album_path):
-                continue
+        albums = {}
+        album_order = []
+        album_files, album_index = build_album_index(self.store)
+        records = self.store.all_records()
+        for album_folder, file_names in album_files.items():
+            # Virtual albums have no folder; their screenshots are shown from Screenshots/
+            album_path = os.path.join(albums_directory, album_folder) if not VIRTUAL_ALBUMS else screenshots_directory
+            txt_directory = album_path if not VIRTUAL_ALBUMS else text_files_directory
             items = []
-            for file_name in sorted(os.listdir(album_path)):
-                if not file_name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".webp")):
-                    continue
+            for file_name in file_names:
                 image_path = os.path.join(album_path, file_name)
                 txt_file_name = os.path.splitext(file_name)[0] + ".txt"
-                txt_file_path = os.path.join(album_path, txt_file_name)
-                title, description, tags = "", "", []
-                if os.path.exists(txt_file_path):
-                    with open(txt_file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    title, description, tags = SnaptureProcessor.parse_txt(content)
+                txt_file_path = os.path.join(txt_directory, txt_file_name)
+                title, description, tags, _ = records.get(file_name, ("", "", [], None))
                 item = ScreenshotItem(file_name, image_path, title, description, tags, txt_file_path, album=album_folder)
                 items.append(item)
             if items:
-                self.albums[album_folder] = items
-                self.album_order.append(album_folder)
+                albums[album_folder] = items
+                album_order.append(album_folder)
 
         # Load all screenshots (including those in albums and uncategorized)
-        self.all_screenshots = []
+        all_screenshots = []
         # Add uncategorized screenshots (not in any album)
-        album_file_names = set()
-        for album_items in self.albums.values():
-            for item in album_items:
-                album_file_names.add(item.file_name)
-        for file_name in sorted(os.listdir(screenshots_directory)):
-            if not file_name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".webp")):
+        for file_name in sorted(library_scanner.list_images(screenshots_directory)):
+            # If this file is also in an album, skip adding here (will show in album section)
+            if file_name in album_index:
                 continue
             image_path = os.path.join(screenshots_directory, file_name)
             txt_file_name = os.path.splitext(file_name)[0] + ".txt"
             txt_file_path = os.path.join(text_files_directory, txt_file_name)
-            title, description, tags = "", "", []
-            if os.path.exists(txt_file_path):
-                with open(txt_file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                title, description, tags = SnaptureProcessor.parse_txt(content)
-            # If this file is also in an album, skip adding here (will show in album section)
-            if file_name in album_file_names:
-                continue
+            title, description, tags, _ = records.get(file_name, ("", "", [], None))
             item = ScreenshotItem(file_name, image_path, title, description, tags, txt_file_path)
-            self.all_screenshots.append(item)
+            all_screenshots.append(item)
         # Add all album screenshots (flattened)
-        for album_name in self.album_order:
-            for item in self.albums[album_name]:
+        for album_name in album_order:
+            for item in albums[album_name]:
                 # For the "all" section, we want to show all screenshots, so add them too
-                self.all_screenshots.append(item)
+                all_screenshots.append(item)
+        return albums, album_order, all_screenshots
+
+    def apply_catalog(self, albums, album_order, all_screenshots):
+        self.albums = albums
+        self.album_order = album_order
+        self.all_screenshots = all_screenshots
+        self.search_index.sync((item.file_name, search_fields(item), item) for item in all_screenshots)
+        self.album_search_index.sync((album_name, (album_name,), album_name) for album_name in album_order)
+        self.facet_index.sync((item.file_name, item) for item in all_screenshots)
+        self.active_facets = {
+            (facet, facet_value) for facet, facet_value in self.active_facets
+            if facet_value in self.facet_index.facets[facet]
+        }
+        self._create_facet_chips()
+        self._catalog_generation = getattr(self, "_catalog_generation", 0) + 1
         self.update_main_page()
 
-    def start_processing(self):
+    def _validate_catalog(self):
+        # Background pass after a snapshot start: rebuild from disk and swap in only if it differs
+        generation = self._catalog_generation
+
+        def worker():
+            catalog = self.build_catalog()
+            self.root.after(0, finish, catalog)
+
+        def finish(catalog):
+            if generation != self._catalog_generation:
+                return  # the model was reloaded meanwhile, which already reflects the disk
+            if catalog_rows(catalog[2]) != catalog_rows(self.all_screenshots):
+                self.apply_catalog(*catalog)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_close(self):
+        if self.watcher:
+            self.watcher.stop()
+        try:
+            save_catalog_snapshot(catalog_snapshot_path, self.all_screenshots)
+        except OSError as e:
+            print(f"⚠️ Could not save catalog snapshot: {e}")
+        self.root.destroy()
+
+    def start_processing(self, only_files=None, changed_files=()):
         if self.processing:
             return
         self.processing = True
         self.show_slide_notification("Processing uncategorized screenshots...")
         self.play_button_label.config(state="disabled")
-        self.processor = SnaptureProcessor(self.process_update)
+        self.processor = SnaptureProcessor(self.process_update, only_files=only_files, changed_files=changed_files, store=self.store)
         threading.Thread(target=self.processor.run, daemon=True).start()
 
+    def start_recut(self, threshold):
+        threshold = round(threshold, 2)
+        if self.processing:
+            self.threshold_var.set(self.store.cluster_threshold())
+            return
+        if threshold == self.store.cluster_threshold():
+            return
+        self.processing = True
+        self.show_slide_notification(f"Regrouping albums at similarity {threshold:.2f}...")
+        self.play_button_label.config(state="disabled")
+        self.processor = SnaptureProcessor(self.process_update, store=self.store)
+        threading.Thread(target=self.processor.recut, args=(threshold,), daemon=True).start()
+
+    def _on_screenshots_changed(self, changes):
+        # Update the model for just the affected files, then caption the new/changed ones
+        self.store.forget(changes["deleted"])
+        for file_name in changes["deleted"]:
+            self.all_screenshots = [
+                item for item in self.all_screenshots
+                if item.album or item.file_name != file_name
+            ]
+        loaded = {item.file_name for item in self.all_screenshots}
+        for file_name in changes["deleted"] - loaded:
+            self.search_index.remove(file_name)
+            self.facet_index.remove(file_name)
+        first_album_position = next((i for i, item in enumerate(self.all_screenshots) if item.album), len(self.all_screenshots))
+        for file_name in sorted(changes["added"] - loaded):
+            title, description, tags, _ = self.store.get(file_name) or ("", "", [], None)
+            txt_file_path = os.path.join(text_files_directory, os.path.splitext(file_name)[0] + ".txt")
+            item = ScreenshotItem(file_name, os.path.join(screenshots_directory, file_name), title, description, tags, txt_file_path)
+            self.all_screenshots.insert(first_album_position, item)
+            first_album_position += 1
+            self.search_index.update(file_name, search_fields(item), item)
+            self.facet_index.update(file_name, item)
+        self._create_facet_chips()
+        self.update_main_page()
+
+        for kind in ("added", "changed"):
+            self.pending_changes[kind] |= changes[kind]
+        self.pending_changes["added"] -= changes["deleted"]
+        self.pending_changes["changed"] -= changes["deleted"]
+        self._process_pending_changes()
+
+    def _process_pending_changes(self):
+        if self.processing or not (self.pending_changes["added"] or self.pending_changes["changed"]):
+            return
+        added, changed = self.pending_changes["added"], self.pending_changes["changed"]
+        self.pending_changes["added"], self.pending_changes["changed"] = set(), set()
+        self.start_processing(only_files=added | changed, changed_files=changed)
+
+    def _apply_captioned(self, captioned_item):
+        # Copy fresh captions onto the displayed item instead of reloading the whole library
+        for item in self.all_screenshots:
+            if item.file_name == captioned_item.file_name:
+                item.title = captioned_item.title
+                item.description = captioned_item.description
+                item.tags = captioned_item.tags
+                self.search_index.update(item.file_name, search_fields(item), item)
+                self.facet_index.update(item.file_name, item)
+        self._create_facet_chips()
+        self.update_main_page()
+
     def process_update(self, event, data):
         # Called from background thread, so use after() for UI updates
         def _update():
             if event == "captioned":
                 self.show_slide_notification(f"Captioned: {data.file_name}")
-                self.load_all_data()
+                self._apply_captioned(data)
             elif event == "clustered":
                 album_name, items = data
                 self.show_slide_notification(f"Clustered: {album_name}")
@@ -763,10 +3434,11 @@ class SnaptureGUI:
             elif event == "info":
                 self.show_slide_notification(str(data))
             elif event == "done":
-                self.show_slide_notification("Done! Check Albums section below.")
+                self.show_slide_notification(" ".join(filter(None, ["Done! Check Albums section below.", data])))
                 self.processing = False
                 self.play_button_label.config(state="normal")
                 self.load_all_data()
+                self._process_pending_changes()
             elif event == "error":
                 self.show_slide_notification(str(data))
                 self.processing = False
@@ -790,6 +3462,10 @@ class SnaptureGUI:
 
         # Get current filter selection
         current_filter = self.search_type_var.get()
+        # Tag and album facets narrow both the screenshots and the albums shown
+        facet_mask = self._facet_mask()
+        visible_screenshots = self.all_screenshots if facet_mask is None else self.facet_index.items(facet_mask)
+        visible_albums = self._faceted_albums(facet_mask)
 
         # --- All Screenshots Section ---
         # Set a left margin for all content (including headings and grids)
@@ -799,22 +3475,22 @@ class SnaptureGUI:
         # Determine what to show based on filter
         if current_filter == "Screenshots":
             # Show both categorized and uncategorized screenshots in separate sections
-            categorized_screenshots = [item for item in self.all_screenshots if item.album]
-            uncategorized_screenshots = [item for item in self.all_screenshots if not item.album]
-            total_screenshots = len(self.all_screenshots)
+            categorized_screenshots = [item for item in visible_screenshots if item.album]
+            uncategorized_screenshots = [item for item in visible_screenshots if not item.album]
+            total_screenshots = len(visible_screenshots)
             categorized_count = len(categorized_screenshots)
             uncategorized_count = len(uncategorized_screenshots)
             heading_text = f"Screenshots ({total_screenshots} total)"
             show_albums_section = False
         elif current_filter == "Albums":
             # Show album names as large squares with album covers (no individual screenshots)
-            heading_text = f"Albums ({len(self.album_order)} total)"
+            heading_text = f"Albums ({len(visible_albums)} total)"
             show_albums_section = False
             show_album_grid = True
             screenshots = []  # Don't show individual screenshots in Albums filter
         else:  # "All"
             # Show all screenshots and albums in separate sections
-            screenshots = self.all_screenshots
+            screenshots = visible_screenshots
             heading_text = "All Screenshots"
             show_albums_section = True
             show_album_grid = True  # Show album grid in All filter
@@ -835,7 +3511,7 @@ class SnaptureGUI:
                 screenshots_to_show = search_screenshots
             album_names_to_show = album_names if current_filter != "Screenshots" else []
         else:
-            album_names_to_show = self.album_order if show_albums_section else []
+            album_names_to_show = visible_albums if show_albums_section else []
 
         heading1 = tk.Label(self.main_inner, text=heading_text, font=("Segoe UI", 18, "bold"), bg="#f7f7fa")
         heading1.grid(row=0, column=0, sticky="w", padx=LEFT_MARGIN, pady=(20, 10), columnspan=100)
@@ -1029,7 +3705,7 @@ class SnaptureGUI:
         if (current_filter == "Albums" or current_filter == "All") and show_album_grid:
             # Add albums section heading for All filter
             if current_filter == "All":
-                albums_heading = tk.Label(self.main_inner, text=f"Albums ({len(self.album_order)} total)", font=("Segoe UI", 18, "bold"), bg="#f7f7fa")
+                albums_heading = tk.Label(self.main_inner, text=f"Albums ({len(visible_albums)} total)", font=("Segoe UI", 18, "bold"), bg="#f7f7fa")
                 albums_heading.grid(row=row, column=0, sticky="w", padx=LEFT_MARGIN, pady=(40, 16), columnspan=100)
                 row += 1
             
@@ -1058,8 +3734,8 @@ class SnaptureGUI:
             # Create album grid
             album_grid = []
             idx = 0
-            while idx < len(self.album_order):
-                row_albums = self.album_order[idx:idx+album_max_cols]
+            while idx < len(visible_albums):
+                row_albums = visible_albums[idx:idx+album_max_cols]
                 album_grid.append(row_albums)
                 idx += album_max_cols
             
@@ -1363,7 +4039,41 @@ class SnaptureGUI:
             label.pack(side="left", padx=(5, 5))
 
 # === Main ===
+def run_headless():
+    # Runs the pipeline without the GUI and reports timings, e.g. to benchmark a backend
+    started = time.monotonic()
+
+    def report(event, data):
+        if event == "captioned":
+            print(f"Captioned: {data.file_name}")
+        elif event == "clustered":
+            print(f"Clustered: {data[0]} ({len(data[1])} screenshots)")
+        elif event in ("info", "error"):
+            print(data)
+
+    processor = SnaptureProcessor(report)
+    if "--recut" in sys.argv:
+        processor.recut(float(sys.argv[sys.argv.index("--recut") + 1]))
+    else:
+        processor.run()
+    elapsed = time.monotonic() - started
+    print(f"Finished {len(processor.screenshot_items)} screenshots in {elapsed:.1f}s (backend: {AI_BACKEND})")
+    if mock_server is not None:
+        print(f"Mock backend served {mock_server.requests} requests")
+
+
 def main():
+    if "--headless" in sys.argv:
+        run_headless()
+        return
+    if "--export-txt" in sys.argv:
+        store = MetadataStore(database_path)
+        try:
+            exported = store.export_txt_files()
+        finally:
+            store.close()
+        print(f"Exported {exported} TXT files.")
+        return
     root = tk.Tk()
     style = ttk.Style(root)
     style.theme_use("clam")